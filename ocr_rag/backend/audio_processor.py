@@ -1,23 +1,137 @@
+import asyncio
+import binascii
+import hashlib
+import io
+import json
 import os
+import subprocess
 import tempfile
-import base64
-from typing import Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Optional
 from pathlib import Path
+
 from loguru import logger
 
-from openai import OpenAI
-from pydub import AudioSegment
-from moviepy.editor import VideoFileClip
 from config import settings
 
+# 注意：openai/httpx/pydub 体量大（连带numpy等传递依赖），
+# 全部延迟到实际使用时导入，避免纯文本请求路径为音频栈买单。
+
+# Whisper API 原生接受的容器格式（按内容嗅探的结果判断，而非扩展名）
+_WHISPER_NATIVE_FORMATS = frozenset({"mp3", "wav", "flac", "ogg", "m4a", "mp4", "webm"})
+
+# 扩展名集合：frozenset提供O(1)查找，且不会在每次调用时重建列表字面量
+_VIDEO_EXTS = frozenset({".mp4", ".avi", ".mov", ".mkv", ".webm"})
+_AUDIO_EXTS = frozenset({".mp3", ".wav", ".flac", ".m4a", ".ogg"})
+
+# 长音频分段参数：超过阈值的文件按静音边界切段并发转写。
+# 段长除20分钟目标外还受上传体积约束：切出的段以未压缩WAV上传，
+# 实际上限要按导出字节率折算（见 _transcribe_long_audio），
+# 这里给25MB限制留1MB余量
+_LONG_AUDIO_THRESHOLD_S = 600
+_CHUNK_TARGET_MS = 20 * 60 * 1000
+_CUT_SEARCH_WINDOW_MS = 60 * 1000
+_UPLOAD_LIMIT_BYTES = 24 * 1024 * 1024
+
+
+# 流式解码块大小：64KiB字符（4的倍数，base64按4字符一组解码）
+_B64_CHUNK_CHARS = 64 * 1024
+
+# 转写结果缓存：以文件内容哈希为键，重复上传同一段音频（用户重试很常见）
+# 时直接命中，免去一次完整的上传+Whisper推理。JSONL落盘在进程间持久化。
+_TRANSCRIPT_CACHE_PATH = Path(__file__).parent / "data" / "whisper_cache.jsonl"
+_transcript_cache: Dict[str, Dict[str, Any]] = {}
+_transcript_cache_loaded = False
+_transcript_cache_lock = threading.Lock()
+
+
+def _hash_file(file_path: str) -> str:
+    """流式计算文件内容的blake2b摘要（16字节）"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _transcript_cache_get(digest: str) -> Optional[Dict[str, Any]]:
+    global _transcript_cache_loaded
+    with _transcript_cache_lock:
+        if not _transcript_cache_loaded:
+            _transcript_cache_loaded = True
+            if _TRANSCRIPT_CACHE_PATH.exists():
+                try:
+                    with _TRANSCRIPT_CACHE_PATH.open("r", encoding="utf-8") as f:
+                        for line in f:
+                            line = line.strip()
+                            if line:
+                                entry = json.loads(line)
+                                _transcript_cache[entry["digest"]] = entry
+                except Exception as e:
+                    logger.warning(f"⚠️ 转写缓存加载失败: {e}")
+        return _transcript_cache.get(digest)
+
+
+def _transcript_cache_put(digest: str, transcription: str, duration: float) -> None:
+    entry = {"digest": digest, "transcription": transcription, "duration": duration}
+    with _transcript_cache_lock:
+        _transcript_cache[digest] = entry
+        try:
+            _TRANSCRIPT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with _TRANSCRIPT_CACHE_PATH.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.warning(f"⚠️ 转写缓存写入失败: {e}")
+
+
+def _decode_base64_to(data: str, sink) -> None:
+    """
+    分块解码base64字符串并写入sink，避免一次性物化整个解码结果
+    （一次性 b64decode 的峰值内存约为音频体积的2倍）。
+
+    容忍换行/MIME折行的输入：每块先去掉空白字符，再按4字符对齐解码，
+    不足4字符的尾巴并入下一块，否则折行会让块边界落在编码组中间而报错。
+    """
+    pending = ""
+    for i in range(0, len(data), _B64_CHUNK_CHARS):
+        chunk = pending + "".join(data[i:i + _B64_CHUNK_CHARS].split())
+        usable = len(chunk) & ~3
+        sink.write(binascii.a2b_base64(chunk[:usable]))
+        pending = chunk[usable:]
+    if pending:
+        sink.write(binascii.a2b_base64(pending))
+
+
+@contextmanager
+def _scratch_file(suffix: str = ".wav"):
+    """临时文件上下文管理器：无论成功或异常退出都会清理，不再需要手动unlink"""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
 class AudioProcessor:
     def __init__(self):
-        self.client = OpenAI(
+        import httpx
+        from openai import AsyncOpenAI
+
+        # HTTP/2 + 保活连接池：并发的Whisper上传复用同一条TCP/TLS会话
+        self.client = AsyncOpenAI(
             api_key=settings.openai_api_key,
-            base_url=settings.openai_base_url
+            base_url=settings.openai_base_url,
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+            )
         )
-    
-    def process_audio_file(self, file_path: str, filename: str) -> Dict[str, Any]:
+
+    async def process_audio_file(self, file_path: str, filename: str) -> Dict[str, Any]:
         """
         处理音频文件：转换格式、语音转文字
         
@@ -34,24 +148,41 @@ class AudioProcessor:
             # 检测文件类型
             file_ext = Path(filename).suffix.lower()
             logger.info(f"文件格式: {file_ext}")
-            
-            # 转换为支持的音频格式
-            audio_path = self._convert_to_audio(file_path, file_ext)
-            
-            # 语音转文字
-            transcription = self._transcribe_audio(audio_path)
-            
-            # 清理临时文件
-            if audio_path != file_path:
-                os.unlink(audio_path)
-            
+
+            # 内容哈希命中缓存时直接返回，跳过转换与上传
+            digest = await asyncio.to_thread(_hash_file, file_path)
+            cached = _transcript_cache_get(digest)
+            if cached is not None:
+                logger.info(f"⚡ 转写缓存命中: {filename}")
+                return {
+                    "filename": filename,
+                    "transcription": cached["transcription"],
+                    "duration": cached["duration"],
+                    "format": file_ext
+                }
+
+            # 转换为支持的音频格式并转写；scratch文件在with退出时自动清理
+            # 时长由转换路径顺带产出：pydub分支直接读已解码对象，其余走ffprobe
+            with _scratch_file() as scratch_path:
+                # 格式转换是阻塞的subprocess/pydub调用，放到线程里执行
+                audio_path, duration = await asyncio.to_thread(
+                    self._convert_to_audio, file_path, file_ext, scratch_path
+                )
+                if duration > _LONG_AUDIO_THRESHOLD_S:
+                    # 长音频：分段并发转写，避免超过API的25MB上限
+                    transcription = await self._transcribe_long_audio(audio_path)
+                else:
+                    transcription = await self._transcribe_audio(audio_path)
+
+            _transcript_cache_put(digest, transcription, duration)
+
             result = {
                 "filename": filename,
                 "transcription": transcription,
-                "duration": self._get_audio_duration(file_path, file_ext),
+                "duration": duration,
                 "format": file_ext
             }
-            
+
             logger.info(f"✅ 音频处理完成: {len(transcription)} 字符")
             return result
             
@@ -59,103 +190,249 @@ class AudioProcessor:
             logger.error(f"❌ 音频处理失败: {e}")
             raise Exception(f"音频处理失败: {str(e)}")
     
-    def _convert_to_audio(self, file_path: str, file_ext: str) -> str:
+    async def process_audio_batch(self, files: List[Tuple[str, str]], max_concurrency: int = 8) -> List[Dict[str, Any]]:
         """
-        将视频文件转换为音频文件
-        
+        并发处理多个音频文件（批量转写）
+
+        逐个串行上传时，总耗时随文件数线性增长；转写是网络密集型操作，
+        并发调用 Whisper 可以让 N 个文件的总耗时接近最慢的一个。
+
+        Args:
+            files: (file_path, filename) 元组列表
+            max_concurrency: 最大并发数
+
+        Returns:
+            与输入顺序一致的结果字典列表；单个文件失败时对应项包含 error 字段
+        """
+        if not files:
+            return []
+
+        logger.info(f"🚀 开始批量处理 {len(files)} 个音频文件 (并发数: {max_concurrency})")
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _process_one(item: Tuple[str, str]) -> Dict[str, Any]:
+            file_path, filename = item
+            async with semaphore:
+                try:
+                    return await self.process_audio_file(file_path, filename)
+                except Exception as e:
+                    logger.error(f"❌ 批量处理中单个文件失败: {filename}, 错误: {e}")
+                    return {"filename": filename, "error": str(e)}
+
+        # gather 保证返回顺序与输入顺序一致
+        results = await asyncio.gather(*(_process_one(item) for item in files))
+
+        success_count = sum(1 for r in results if "error" not in r)
+        logger.info(f"✅ 批量处理完成: {success_count}/{len(files)} 个成功")
+        return list(results)
+
+    def _convert_to_audio(self, file_path: str, file_ext: str, scratch_path: str) -> Tuple[str, float]:
+        """
+        将视频/未知格式文件转换为音频文件
+
         Args:
             file_path: 源文件路径
             file_ext: 文件扩展名
-            
+            scratch_path: 由调用方管理生命周期的临时输出路径
+
         Returns:
-            音频文件路径
+            (音频文件路径, 时长秒数)；直传时路径即源路径，转换时为 scratch_path
         """
         # 如果是视频文件，提取音频
-        if file_ext in ['.mp4', '.avi', '.mov', '.mkv', '.webm']:
+        if file_ext in _VIDEO_EXTS:
             logger.info("🎬 检测到视频文件，提取音频...")
-            
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_audio_path = temp_file.name
-            
-            # 使用moviepy提取音频
-            video = VideoFileClip(file_path)
-            audio = video.audio
-            audio.write_audiofile(temp_audio_path, verbose=False, logger=None)
-            audio.close()
-            video.close()
-            
-            logger.info(f"✅ 音频提取完成: {temp_audio_path}")
-            return temp_audio_path
-        
-        # 如果已经是音频文件，检查是否需要格式转换
-        elif file_ext in ['.mp3', '.wav', '.flac', '.m4a', '.ogg']:
-            # OpenAI Whisper支持这些格式，直接返回
-            return file_path
-        
-        else:
-            # 尝试用pydub转换
-            logger.info(f"🔄 转换音频格式: {file_ext}")
-            
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_audio_path = temp_file.name
-            
-            audio = AudioSegment.from_file(file_path)
-            audio.export(temp_audio_path, format="wav")
-            
-            logger.info(f"✅ 格式转换完成: {temp_audio_path}")
-            return temp_audio_path
+
+            # 直接调用ffmpeg提取音频（-vn 跳过视频解码），输出16kHz单声道PCM，匹配Whisper输入
+            subprocess.run(
+                [
+                    "ffmpeg", "-y", "-i", file_path,
+                    "-vn", "-ac", "1", "-ar", "16000", "-acodec", "pcm_s16le",
+                    scratch_path
+                ],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
+            logger.info(f"✅ 音频提取完成: {scratch_path}")
+            return scratch_path, self._get_audio_duration(file_path)
+
+        # 音频文件按真实内容嗅探：扩展名缺失/错误的上传也能免转码直传
+        sniffed = self._sniff_format(file_path)
+        if sniffed in _WHISPER_NATIVE_FORMATS:
+            logger.info(f"🔍 嗅探到Whisper原生格式: {sniffed}，跳过转换")
+            return file_path, self._get_audio_duration(file_path)
+
+        # 无法识别的内容，尝试用pydub转换
+        from pydub import AudioSegment
+
+        logger.info(f"🔄 转换音频格式: {file_ext}")
+
+        # 降到16kHz单声道16bit：Whisper内部本来就重采样到16kHz，
+        # 高采样率立体声只会成倍增加上传体积
+        audio = (
+            AudioSegment.from_file(file_path)
+            .set_frame_rate(16000)
+            .set_channels(1)
+            .set_sample_width(2)
+        )
+        audio.export(scratch_path, format="wav", parameters=["-bitexact"])
+
+        logger.info(f"✅ 格式转换完成: {scratch_path}")
+        # AudioSegment已在内存中，时长直接读取，省掉一次ffprobe
+        return scratch_path, len(audio) / 1000.0
     
-    def _transcribe_audio(self, audio_path: str) -> str:
+    def _sniff_format(self, file_path: str) -> Optional[str]:
+        """
+        读取文件头16字节识别容器格式
+
+        Returns:
+            识别出的格式名（如 'mp3'、'wav'），无法识别时返回 None
+        """
+        try:
+            with open(file_path, "rb") as f:
+                head = f.read(16)
+        except OSError:
+            return None
+
+        if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+            return "mp3"
+        if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+            return "wav"
+        if head.startswith(b"fLaC"):
+            return "flac"
+        if head.startswith(b"OggS"):
+            return "ogg"
+        if head[4:8] == b"ftyp":
+            # mp4/m4a/mov 家族，Whisper均可接受
+            return "mp4"
+        if head.startswith(b"\x1aE\xdf\xa3"):
+            return "webm"
+        return None
+
+    async def _transcribe_audio(self, audio_source) -> str:
         """
         使用OpenAI Whisper进行语音转文字
-        
+
         Args:
-            audio_path: 音频文件路径
-            
+            audio_source: 音频文件路径，或 (文件名, 文件对象) 元组（内存中的音频数据）
+
         Returns:
             转写文本
         """
         logger.info("🗣️ 开始语音转文字...")
-        
-        with open(audio_path, "rb") as audio_file:
-            transcript = self.client.audio.transcriptions.create(
+
+        if isinstance(audio_source, (str, os.PathLike)):
+            with open(audio_source, "rb") as audio_file:
+                transcript = await self.client.audio.transcriptions.create(
+                    model="whisper-1",
+                    file=audio_file,
+                    response_format="text"
+                )
+        else:
+            # (filename, file-like) 元组，直接上传内存数据，无需落盘
+            transcript = await self.client.audio.transcriptions.create(
                 model="whisper-1",
-                file=audio_file,
+                file=audio_source,
                 response_format="text"
             )
-        
+
         transcription = transcript.strip() if isinstance(transcript, str) else transcript.text.strip()
         logger.info(f"📝 转写结果长度: {len(transcription)} 字符")
-        
+
         return transcription
     
-    def _get_audio_duration(self, file_path: str, file_ext: str) -> float:
+    def _find_cut_points(self, audio: "AudioSegment", target_ms: int) -> List[int]:
         """
-        获取音频时长（秒）
-        
+        在每个目标点（target_ms 间隔）前的窗口内寻找静音，
+        返回毫秒级切分点列表。找不到静音时退化为在目标点硬切。
+        """
+        from pydub import silence
+
+        cut_points = []
+        start = 0
+        total = len(audio)
+        while total - start > target_ms:
+            target = start + target_ms
+            window_start = max(start, target - _CUT_SEARCH_WINDOW_MS)
+            window = audio[window_start:target]
+            silences = silence.detect_silence(
+                window,
+                min_silence_len=400,
+                silence_thresh=window.dBFS - 16 if window.dBFS != float("-inf") else -48
+            )
+            if silences:
+                # 取窗口内最后一段静音的中点，尽量贴近目标长度
+                s_start, s_end = silences[-1]
+                cut = window_start + (s_start + s_end) // 2
+            else:
+                cut = target
+            cut_points.append(cut)
+            start = cut
+        return cut_points
+
+    async def _transcribe_long_audio(self, audio_path: str) -> str:
+        """
+        长音频分段转写：按静音边界切段，各段经内存WAV并发上传后拼接结果。
+        """
+        from pydub import AudioSegment
+
+        audio = await asyncio.to_thread(AudioSegment.from_file, audio_path)
+        # 段长目标取"20分钟"与"按字节率折算出的上限时长"的较小者：
+        # WAV是未压缩PCM，字节率=采样率×帧宽（声道×位宽）。16kHz单声道
+        # 16bit下20分钟约38MB，必须按字节率折算才能保证每段低于25MB；
+        # 原生格式路径按源采样率解码（如44.1kHz立体声），折算后段更短
+        bytes_per_ms = audio.frame_rate * audio.frame_width / 1000.0
+        target_ms = min(_CHUNK_TARGET_MS, int(_UPLOAD_LIMIT_BYTES / bytes_per_ms))
+        cut_points = await asyncio.to_thread(self._find_cut_points, audio, target_ms)
+        bounds = [0] + cut_points + [len(audio)]
+        logger.info(f"🪓 长音频切分为 {len(bounds) - 1} 段")
+
+        def _export_segment(begin: int, end: int) -> io.BytesIO:
+            buf = io.BytesIO()
+            audio[begin:end].export(buf, format="wav")
+            buf.seek(0)
+            return buf
+
+        async def _transcribe_segment(i: int, begin: int, end: int) -> str:
+            buf = await asyncio.to_thread(_export_segment, begin, end)
+            return await self._transcribe_audio((f"chunk{i}.wav", buf))
+
+        parts = await asyncio.gather(*(
+            _transcribe_segment(i, bounds[i], bounds[i + 1])
+            for i in range(len(bounds) - 1)
+        ))
+        return " ".join(p.strip() for p in parts if p.strip())
+
+    def _get_audio_duration(self, file_path: str) -> float:
+        """
+        获取音视频时长（秒）
+
+        用ffprobe读取容器元数据，音频和视频文件统一处理，
+        无需像pydub那样把整个文件解码成PCM。
+
         Args:
             file_path: 文件路径
-            file_ext: 文件扩展名
-            
+
         Returns:
-            时长（秒）
+            时长（秒），失败时返回 0.0
         """
         try:
-            if file_ext in ['.mp4', '.avi', '.mov', '.mkv', '.webm']:
-                # 视频文件
-                video = VideoFileClip(file_path)
-                duration = video.duration
-                video.close()
-                return duration
-            else:
-                # 音频文件
-                audio = AudioSegment.from_file(file_path)
-                return len(audio) / 1000.0  # 转换为秒
+            output = subprocess.check_output(
+                [
+                    "ffprobe", "-v", "error",
+                    "-show_entries", "format=duration",
+                    "-of", "default=nw=1:nk=1",
+                    file_path
+                ],
+                stderr=subprocess.DEVNULL
+            )
+            return float(output)
         except Exception as e:
             logger.warning(f"⚠️ 无法获取音频时长: {e}")
             return 0.0
 
-    def process_audio_base64(self, base64_data: str, filename: str) -> Dict[str, Any]:
+    async def process_audio_base64(self, base64_data: str, filename: str) -> Dict[str, Any]:
         """
         处理base64编码的音频数据
         
@@ -166,18 +443,47 @@ class AudioProcessor:
         Returns:
             包含转写结果的字典
         """
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename).suffix) as temp_file:
-            # 解码base64数据
-            audio_data = base64.b64decode(base64_data)
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
-        
+        file_ext = Path(filename).suffix.lower()
+
+        # Whisper原生支持的格式直接走内存上传，省掉临时文件的一写两读
+        if file_ext in _AUDIO_EXTS:
+            logger.info(f"开始处理音频数据（内存直传）: {filename}")
+            bio = io.BytesIO()
+            _decode_base64_to(base64_data, bio)
+            duration = await asyncio.to_thread(self._get_bytes_duration, bio.getbuffer())
+            bio.seek(0)
+            transcription = await self._transcribe_audio((filename, bio))
+            return {
+                "filename": filename,
+                "transcription": transcription,
+                "duration": duration,
+                "format": file_ext
+            }
+
+        # 需要格式转换的文件仍然落盘处理，解码结果直接流入临时文件
+        with _scratch_file(suffix=file_ext) as temp_file_path:
+            with open(temp_file_path, "wb") as temp_file:
+                _decode_base64_to(base64_data, temp_file)
+            return await self.process_audio_file(temp_file_path, filename)
+
+    def _get_bytes_duration(self, audio_data) -> float:
+        """通过ffprobe管道读取内存音频数据的时长（秒），失败时返回 0.0"""
         try:
-            # 处理音频文件
-            result = self.process_audio_file(temp_file_path, filename)
-            return result
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path) 
\ No newline at end of file
+            output = subprocess.check_output(
+                [
+                    "ffprobe", "-v", "error",
+                    "-show_entries", "format=duration",
+                    "-of", "default=nw=1:nk=1",
+                    "pipe:0"
+                ],
+                input=audio_data,
+                stderr=subprocess.DEVNULL
+            )
+            return float(output)
+        except Exception as e:
+            logger.warning(f"⚠️ 无法获取音频时长: {e}")
+            return 0.0
+
+    # 兼容旧的同步调用方（脚本/CLI），内部起事件循环执行协程
+    def process_audio_file_sync(self, file_path: str, filename: str) -> Dict[str, Any]:
+        return asyncio.run(self.process_audio_file(file_path, filename))
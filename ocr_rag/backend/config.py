@@ -1,7 +1,13 @@
 import os
+from functools import lru_cache
 from typing import List, Optional
+from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
+# 在构造任何 Settings 之前把 .env 注入进程环境：此前 main.py 在配置
+# 已物化之后才 load_dotenv，.env 的变更会被静默忽略
+load_dotenv()
+
 
 class Settings(BaseSettings):
     """应用配置"""
@@ -14,6 +20,10 @@ class Settings(BaseSettings):
     host: str = "localhost"
     port: int = 8000
     debug: bool = True
+    # debug 与热重载解耦：reload 只给本地开发开，生产默认关闭
+    # （文件监视会多fork一个进程并禁用部分 asyncio 优化）
+    reload: bool = False
+    workers: int = 1
     
     # CORS 配置
     allowed_origins: List[str] = ["http://localhost:5173", "http://localhost:3000"]
@@ -26,6 +36,12 @@ class Settings(BaseSettings):
     default_model: str = "deepseek-chat"
     max_tokens: int = 2048
     temperature: float = 1.0
+
+    # 工具调用并发上限（同一轮内并行执行的工具数）
+    tool_concurrency_limit: int = 4
+
+    # 进程级共享线程池的工作线程数（阻塞型搜索等调用共用）
+    scraper_workers: int = 20
     
     # ModelScope 配置 (用于通义千问等模型)
     modelscope_api_key: str = "ms-f34cc515-37b3-41a6-ac34-2205a12517e7"
@@ -36,6 +52,15 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        # 冻结实例：配置只读，属性访问可被 pydantic 内部化
+        frozen = True
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """惰性构造并缓存配置实例：env 解析与校验进程内只执行一次"""
+    return Settings()
+
 
-# 创建全局配置实例
-settings = Settings()
\ No newline at end of file
+# 全局配置实例（保持 `from config import settings` 的既有用法）
+settings = get_settings()
\ No newline at end of file
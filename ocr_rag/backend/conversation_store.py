@@ -1,41 +1,303 @@
+import atexit
 import json
+import os
+import re
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 DATA_DIR = Path(__file__).parent / "data" / "conversations"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# 存储布局：
+#   {id}.meta.json      会话元数据（标题、时间戳等），只在元数据变化时重写
+#   {id}.messages.jsonl 消息追加日志，每条消息一行，追加写入
+# 这样 append_message 的磁盘成本是 O(单条消息)，与历史长度无关；
+# 旧版单文件 {id}.json 仍可读取，首次落盘时自动迁移到新格式。
+
+# 进程内会话缓存：session_id -> 会话对象
+# append_message 只改内存并标记脏，由防抖定时器批量落盘，
+# 避免每条消息都做一次完整的 读文件-解析-序列化-写文件 循环。
+_cache: Dict[str, Dict[str, Any]] = {}
+_dirty: set = set()
+_persisted_counts: Dict[str, int] = {}  # 已写入jsonl的消息数
+_meta_written: Dict[str, str] = {}      # 上次写meta时的标题，用于跳过未变化的重写
+_legacy: set = set()                    # 从旧版单文件加载、待迁移的会话
+_lock = threading.RLock()
+_flush_timer: Optional[threading.Timer] = None
+_FLUSH_DELAY = 0.25  # 秒，写合并窗口
+
+# 会话列表索引：session_id -> 摘要（id/title/created_at/updated_at/message_count）
+# 持久化在 index.json 中，启动时加载（缺失时扫盘重建一次），
+# 之后随创建/追加/改标题/删除增量维护，list_conversations 不再逐文件解析。
+_index_path = DATA_DIR / "index.json"
+_index: Dict[str, Dict[str, Any]] = {}
+_index_dirty = False
+
+# 标题生成线程池：复用线程并限制并发，避免每条首轮消息都新建OS线程
+_title_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="title-gen")
+atexit.register(_title_executor.shutdown, wait=False)
+
 
 def _now_iso():
     return datetime.now().isoformat()
 
 
 def _conversation_path(session_id: str) -> Path:
+    """旧版单文件路径（仅用于兼容读取与迁移）"""
     return DATA_DIR / f"{session_id}.json"
 
 
-def list_conversations() -> List[Dict[str, Any]]:
-    items = []
+def _meta_path(session_id: str) -> Path:
+    return DATA_DIR / f"{session_id}.meta.json"
+
+
+def _messages_path(session_id: str) -> Path:
+    return DATA_DIR / f"{session_id}.messages.jsonl"
+
+
+def _dumps(obj: Dict[str, Any]) -> bytes:
+    """序列化会话对象；优先走orjson的C实现，缺省时退回stdlib json"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _dumps_line(obj: Dict[str, Any]) -> bytes:
+    """紧凑序列化单条消息（jsonl行）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _meta_of(obj: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": obj.get("id"),
+        "title": obj.get("title"),
+        "metadata": obj.get("metadata", {}),
+        "created_at": obj.get("created_at"),
+    }
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """写临时文件、fsync后 os.replace 换入，崩溃时读者永远看不到半截文件"""
+    tmp = path.parent / (path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _write_meta(session_id: str, obj: Dict[str, Any]) -> None:
+    _atomic_write(_meta_path(session_id), _dumps(_meta_of(obj)))
+
+
+def _schedule_flush() -> None:
+    global _flush_timer
+    with _lock:
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(_FLUSH_DELAY, _flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def _flush() -> None:
+    """将所有脏会话落盘（防抖回调，也在进程退出时调用）"""
+    global _flush_timer, _index_dirty
+    with _lock:
+        _flush_timer = None
+        pending = [(sid, _cache[sid]) for sid in _dirty if sid in _cache]
+        _dirty.clear()
+        index_snapshot = dict(_index) if _index_dirty else None
+        _index_dirty = False
+    if index_snapshot is not None:
+        try:
+            _atomic_write(_index_path, _dumps(index_snapshot))
+        except Exception:
+            with _lock:
+                _index_dirty = True
+    for sid, obj in pending:
+        try:
+            messages = obj.get("messages", [])
+            start = _persisted_counts.get(sid, 0)
+            if start < len(messages):
+                with _messages_path(sid).open("ab") as f:
+                    for m in messages[start:]:
+                        f.write(_dumps_line(m) + b"\n")
+                _persisted_counts[sid] = len(messages)
+
+            # 元数据（标题等）没变化就不重写meta文件
+            if _meta_written.get(sid) != obj.get("title"):
+                _write_meta(sid, obj)
+                _meta_written[sid] = obj.get("title")
+
+            # 旧版单文件迁移完成后删除，避免重复列出
+            if sid in _legacy:
+                legacy_p = _conversation_path(sid)
+                if legacy_p.exists():
+                    legacy_p.unlink()
+                _legacy.discard(sid)
+        except Exception:
+            # 写失败时重新标脏，等待下一次机会
+            with _lock:
+                _dirty.add(sid)
+
+
+atexit.register(_flush)
+
+
+def _count_lines(path: Path) -> int:
+    try:
+        with path.open("rb") as f:
+            return sum(1 for line in f if line.strip())
+    except OSError:
+        return 0
+
+
+def _load_from_disk(session_id: str) -> Optional[Dict[str, Any]]:
+    meta_p = _meta_path(session_id)
+    if meta_p.exists():
+        obj = _loads(meta_p.read_bytes())
+        messages = []
+        mp = _messages_path(session_id)
+        updated_at = obj.get("created_at")
+        if mp.exists():
+            with mp.open("rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        messages.append(_loads(line))
+            updated_at = datetime.fromtimestamp(mp.stat().st_mtime).isoformat()
+        obj["messages"] = messages
+        obj["updated_at"] = updated_at
+        _persisted_counts[session_id] = len(messages)
+        _meta_written[session_id] = obj.get("title")
+        return obj
+
+    # 兼容旧版单文件格式：读取后标记迁移，首次落盘转为新格式
+    legacy_p = _conversation_path(session_id)
+    if legacy_p.exists():
+        obj = _loads(legacy_p.read_bytes())
+        _persisted_counts[session_id] = 0
+        _legacy.add(session_id)
+        return obj
+
+    return None
+
+
+def _load_conversation(session_id: str) -> Optional[Dict[str, Any]]:
+    """从缓存获取会话，未命中时读盘并填充缓存"""
+    with _lock:
+        obj = _cache.get(session_id)
+    if obj is not None:
+        return obj
+    obj = _load_from_disk(session_id)
+    if obj is None:
+        return None
+    with _lock:
+        _cache.setdefault(session_id, obj)
+        return _cache[session_id]
+
+
+def _summary_of(obj: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": obj.get("id"),
+        "title": obj.get("title"),
+        "created_at": obj.get("created_at"),
+        "updated_at": obj.get("updated_at"),
+        "message_count": len(obj.get("messages", []))
+    }
+
+
+def _build_index_from_disk() -> Dict[str, Dict[str, Any]]:
+    """扫描数据目录重建索引（仅在 index.json 缺失/损坏时执行一次）"""
+    index: Dict[str, Dict[str, Any]] = {}
+
+    # 新格式：meta + jsonl，列表信息无需解析消息内容
+    for p in DATA_DIR.glob("*.meta.json"):
+        sid = p.name[:-len(".meta.json")]
+        try:
+            meta = _loads(p.read_bytes())
+        except Exception:
+            continue
+        mp = _messages_path(sid)
+        if mp.exists():
+            updated_at = datetime.fromtimestamp(mp.stat().st_mtime).isoformat()
+            message_count = _count_lines(mp)
+        else:
+            updated_at = meta.get("created_at")
+            message_count = 0
+        index[sid] = {
+            "id": meta.get("id"),
+            "title": meta.get("title"),
+            "created_at": meta.get("created_at"),
+            "updated_at": updated_at,
+            "message_count": message_count
+        }
+
+    # 旧版单文件
     for p in DATA_DIR.glob("*.json"):
+        if p.name.endswith(".meta.json") or p.name == _index_path.name:
+            continue
+        sid = p.stem
+        if sid in index:
+            continue
         try:
-            with p.open("r", encoding="utf-8") as f:
-                obj = json.load(f)
-                items.append({
-                    "id": obj.get("id"),
-                    "title": obj.get("title"),
-                    "created_at": obj.get("created_at"),
-                    "updated_at": obj.get("updated_at"),
-                    "message_count": len(obj.get("messages", []))
-                })
+            obj = _loads(p.read_bytes())
         except Exception:
             continue
+        index[sid] = _summary_of(obj)
+
+    return index
+
+
+def _load_index() -> None:
+    global _index
+    if _index_path.exists():
+        try:
+            _index = _loads(_index_path.read_bytes())
+            return
+        except Exception:
+            pass
+    _index = _build_index_from_disk()
+
+
+def _touch_index(session_id: str, obj: Dict[str, Any]) -> None:
+    """根据缓存中的会话对象增量更新索引并标脏（调用方需持有 _lock）"""
+    global _index_dirty
+    _index[session_id] = _summary_of(obj)
+    _index_dirty = True
+
+
+def list_conversations() -> List[Dict[str, Any]]:
+    with _lock:
+        items = [dict(v) for v in _index.values()]
     # 按更新时间倒序
-    items.sort(key=lambda x: x.get("updated_at", ""), reverse=True)
+    items.sort(key=lambda x: x.get("updated_at", "") or "", reverse=True)
     return items
 
 
+# 启动时加载（或重建）索引
+_load_index()
+
+
 def create_conversation(title: str = "未命名会话", metadata: Dict[str, Any] = None) -> Dict[str, Any]:
     session_id = str(uuid.uuid4())
     obj = {
@@ -46,30 +308,43 @@ def create_conversation(title: str = "未命名会话", metadata: Dict[str, Any]
         "updated_at": _now_iso(),
         "messages": []
     }
-    with _conversation_path(session_id).open("w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+    # 创建时立即写meta，保证会话在磁盘上可见；消息走追加日志
+    _write_meta(session_id, obj)
+    with _lock:
+        _cache[session_id] = obj
+        _persisted_counts[session_id] = 0
+        _meta_written[session_id] = title
+        _touch_index(session_id, obj)
+    _schedule_flush()
     return obj
 
 
 def get_conversation(session_id: str) -> Optional[Dict[str, Any]]:
-    p = _conversation_path(session_id)
-    if not p.exists():
-        return None
-    with p.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    return _load_conversation(session_id)
 
 
 def append_message(session_id: str, message: Dict[str, Any]) -> bool:
-    p = _conversation_path(session_id)
-    if not p.exists():
-        return False
+    return append_messages(session_id, [message])
+
+
+def append_messages(session_id: str, batch: List[Dict[str, Any]]) -> bool:
+    """批量追加消息：一次锁内追加整批，共用一次索引更新与落盘调度。
+
+    同步聊天端点的一问一答走这里，比连调两次 append_message 少一轮
+    锁竞争和防抖定时器调度；标题生成触发逻辑与单条路径一致。
+    """
     try:
-        with p.open("r", encoding="utf-8") as f:
-            obj = json.load(f)
-        
-        obj.setdefault("messages", []).append(message)
-        obj["updated_at"] = _now_iso()
-        
+        obj = _load_conversation(session_id)
+        if obj is None:
+            return False
+
+        with _lock:
+            obj.setdefault("messages", []).extend(batch)
+            obj["updated_at"] = _now_iso()
+            _dirty.add(session_id)
+            _touch_index(session_id, obj)
+        _schedule_flush()
+
         # 智能生成会话标题：在第一轮对话完成后（有1个用户消息和1个助手消息时）
         messages = obj.get("messages", [])
         current_title = obj.get("title", "")
@@ -79,112 +354,125 @@ def append_message(session_id: str, message: Dict[str, Any]) -> bool:
             if messages[0].get("role") == "user" and messages[1].get("role") == "assistant":
                 user_content = messages[0].get("content", "")
                 assistant_content = messages[1].get("content", "")
-                
-                print(f"🎯 检测到第一轮对话完成，准备生成标题 (session_id: {session_id})")
-                
+
+                logger.info(f"🎯 检测到第一轮对话完成，准备生成标题 (session_id: {session_id})")
+
                 # 异步生成标题（不阻塞当前保存操作）
-                import threading
                 def async_generate_title():
                     try:
-                        print(f"🚀 开始异步生成标题...")
+                        logger.debug(f"🚀 开始异步生成标题...")
                         result = generate_conversation_title(session_id, user_content, assistant_content)
                         if result:
-                            print(f"✅ 标题生成成功: {result}")
+                            logger.info(f"✅ 标题生成成功: {result}")
                         else:
-                            print(f"⚠️ 标题生成返回None")
+                            logger.warning(f"⚠️ 标题生成返回None")
                     except Exception as e:
-                        print(f"❌ 异步生成标题失败: {e}")
-                        import traceback
-                        traceback.print_exc()
-                
-                thread = threading.Thread(target=async_generate_title)
-                thread.daemon = True
-                thread.start()
-                
-        with p.open("w", encoding="utf-8") as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
+                        logger.exception(f"❌ 异步生成标题失败: {e}")
+
+                _title_executor.submit(async_generate_title)
+
         return True
     except Exception:
         return False
 
 
 def delete_conversation(session_id: str) -> bool:
-    p = _conversation_path(session_id)
-    if not p.exists():
-        return False
-    p.unlink()
-    return True
+    global _index_dirty
+    with _lock:
+        existed = session_id in _cache
+        _cache.pop(session_id, None)
+        _dirty.discard(session_id)
+        _persisted_counts.pop(session_id, None)
+        _meta_written.pop(session_id, None)
+        _legacy.discard(session_id)
+        if _index.pop(session_id, None) is not None:
+            existed = True
+            _index_dirty = True
+    _schedule_flush()
+    for p in (_meta_path(session_id), _messages_path(session_id), _conversation_path(session_id)):
+        if p.exists():
+            p.unlink()
+            existed = True
+    return existed
+
+
+def _compress(s: str, n: int = 180) -> str:
+    """截断并压缩空白，生成提示词用的短摘要，避免长回答（OCR/base64转储）撑大提示词"""
+    return re.sub(r"\s+", " ", (s or "")[:n]).strip()
+
+
+@lru_cache(maxsize=1)
+def _title_model(api_key: str, base_url: str):
+    """标题生成模型单例；以 (api_key, base_url) 为键，凭证变化时自动重建"""
+    from langchain_deepseek import ChatDeepSeek
+    return ChatDeepSeek(
+        model="deepseek-chat",
+        api_key=api_key,
+        base_url=base_url,
+        temperature=0.3,
+        max_tokens=50
+    )
 
 
 def generate_conversation_title(session_id: str, user_content: str, assistant_content: str) -> Optional[str]:
     """使用大模型生成会话标题（5-15字）"""
     try:
-        print(f"📝 开始生成会话标题 (session_id: {session_id})")
-        print(f"📝 用户内容: {user_content[:100]}...")
-        print(f"📝 助手内容: {assistant_content[:100]}...")
-        
-        from langchain_deepseek import ChatDeepSeek
-        import os
-        
+        logger.info(f"📝 开始生成会话标题 (session_id: {session_id})")
+        logger.debug(f"📝 用户内容: {user_content[:100]}...")
+        logger.debug(f"📝 助手内容: {assistant_content[:100]}...")
+
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
-            print("❌ OPENAI_API_KEY 未设置")
+            logger.error("❌ OPENAI_API_KEY 未设置")
             return None
-        
-        # 初始化模型
-        print(f"🔧 初始化DeepSeek模型...")
-        model = ChatDeepSeek(
-            model="deepseek-chat",
-            api_key=api_key,
-            base_url=os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com"),
-            temperature=0.3,
-            max_tokens=50
-        )
-        
-        # 构建提示词
+
+        # 复用模型单例，避免每次标题生成都重建客户端和HTTP连接池
+        model = _title_model(api_key, os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com"))
+
+        # 构建提示词：先压缩两段内容，减少输入token、加快TTFT
+        user_summary = _compress(user_content)
+        assistant_summary = _compress(assistant_content)
         prompt = f"""请根据以下对话内容，生成一个简短精准的会话标题（5-15字）。只返回标题文本，不要任何解释或标点。
 
-用户问题：{user_content[:200]}
-助手回答：{assistant_content[:200]}
+用户问题：{user_summary}
+助手回答：{assistant_summary}
 
 会话标题："""
-        
-        print(f"🤖 调用大模型生成标题...")
+
+        logger.debug(f"🤖 调用大模型生成标题...")
         # 调用模型生成标题
         response = model.invoke(prompt)
         title = response.content.strip()
-        print(f"📤 模型返回原始标题: {title}")
-        
+        logger.debug(f"📤 模型返回原始标题: {title}")
+
         # 清理标题（去除引号、冒号等）
         title = title.strip('"\':：。！？')
-        
+
         # 限制长度
         if len(title) > 15:
             title = title[:15]
         elif len(title) < 5:
             # 如果生成的标题太短，使用默认方式
-            print(f"⚠️ 生成标题太短，使用默认方式")
+            logger.warning(f"⚠️ 生成标题太短，使用默认方式")
             title = (user_content[:15] + "...") if len(user_content) > 15 else user_content
-        
-        print(f"✨ 最终标题: {title}")
-        
-        # 更新会话标题
-        p = _conversation_path(session_id)
-        if p.exists():
-            print(f"💾 更新会话文件...")
-            with p.open("r", encoding="utf-8") as f:
-                obj = json.load(f)
-            obj["title"] = title
-            obj["updated_at"] = _now_iso()
-            with p.open("w", encoding="utf-8") as f:
-                json.dump(obj, f, ensure_ascii=False, indent=2)
-            print(f"✅ 会话标题已更新: {title}")
+
+        logger.info(f"✨ 最终标题: {title}")
+
+        # 更新会话标题（走缓存 + 脏标记，与消息追加共用落盘路径）
+        obj = _load_conversation(session_id)
+        if obj is not None:
+            logger.debug(f"💾 更新会话标题...")
+            with _lock:
+                obj["title"] = title
+                obj["updated_at"] = _now_iso()
+                _dirty.add(session_id)
+                _touch_index(session_id, obj)
+            _schedule_flush()
+            logger.info(f"✅ 会话标题已更新: {title}")
         else:
-            print(f"❌ 会话文件不存在: {p}")
-        
+            logger.error(f"❌ 会话不存在: {session_id}")
+
         return title
     except Exception as e:
-        print(f"❌ 生成标题失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ 生成标题失败: {e}")
         return None
@@ -7,11 +7,16 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv(override=True)
+load_dotenv(override=False)
 
 def setup_environment():
-    """设置环境变量"""
-    
+    """设置环境变量（幂等，只补默认值，不覆盖 .env 或系统环境中已有的配置）"""
+
+    # 重复调用时直接返回，避免每次导入都重写环境字典
+    if getattr(setup_environment, "_done", False):
+        return
+    setup_environment._done = True
+
     # DeepSeek 配置
     if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  请设置你的 DEEPSEEK_API_KEY")
@@ -19,32 +24,32 @@ def setup_environment():
         print("💡 或在系统环境变量中设置")
         # 不要硬编码设置无效的API key
         # os.environ["OPENAI_API_KEY"] = "your_deepseek_api_key_here"
-    
-    os.environ["OPENAI_BASE_URL"] = "https://api.deepseek.com/v1"
-    
+
+    os.environ.setdefault("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
+
     # ModelScope配置
     if not os.getenv("MODELSCOPE_API_KEY"):
         print("💡 可选：设置 MODELSCOPE_API_KEY 以使用通义千问模型")
-    
-    if not os.getenv("MODELSCOPE_BASE_URL"):
-        os.environ["MODELSCOPE_BASE_URL"] = "https://api-inference.modelscope.cn/v1"
-    
+
+    os.environ.setdefault("MODELSCOPE_BASE_URL", "https://api-inference.modelscope.cn/v1")
+
     # 服务器配置
-    os.environ["HOST"] = "localhost"
-    os.environ["PORT"] = "8000"
-    os.environ["DEBUG"] = "True"
-    
+    os.environ.setdefault("HOST", "localhost")
+    os.environ.setdefault("PORT", "8000")
+    os.environ.setdefault("DEBUG", "True")
+
     # 日志配置
-    os.environ["LOG_LEVEL"] = "INFO"
-    
+    os.environ.setdefault("LOG_LEVEL", "INFO")
+
     # 模型配置
-    os.environ["DEFAULT_MODEL"] = "deepseek-chat"
-    os.environ["MAX_TOKENS"] = "2048"
-    os.environ["TEMPERATURE"] = "0.7"
-    
+    os.environ.setdefault("DEFAULT_MODEL", "deepseek-chat")
+    os.environ.setdefault("MAX_TOKENS", "2048")
+    os.environ.setdefault("TEMPERATURE", "0.7")
+
     # OCR配置 - Tesseract
-    tessdata_path = r"C:\ProgramData\anaconda3\envs\rag\share\tessdata"
-    os.environ["TESSDATA_PREFIX"] = tessdata_path
+    tessdata_path = os.environ.setdefault(
+        "TESSDATA_PREFIX", r"C:\ProgramData\anaconda3\envs\rag\share\tessdata"
+    )
     print(f"✅ TESSDATA_PREFIX 已设置: {tessdata_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+"""
+进程级共享线程池
+阻塞型工具调用（搜索SDK等）统一经由这里 run_in_executor，
+不再依赖各事件循环各自创建的默认线程池：线程数有统一上限，
+进程内复用同一批线程，避免按请求反复建池的开销。
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+
+SHARED_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.scraper_workers,
+    thread_name_prefix="scrape",
+)
@@ -1,17 +1,22 @@
 import os
 import json
 import asyncio
+import time
+import hashlib
+import heapq
 import tempfile
 import re
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Dict, Any, AsyncGenerator, Optional
 from datetime import datetime
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse, JSONResponse
 from pydantic import BaseModel, Field
-from dotenv import load_dotenv
+import httpx
 from loguru import logger
 
 # LangChain imports (使用最新版本的标准方式)
@@ -26,27 +31,51 @@ from conversation_store import (
     create_conversation,
     get_conversation,
     append_message,
+    append_messages,
     delete_conversation,
     generate_conversation_title,
 )
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
 # 本地配置
 from config import settings
 from pdf_processor import PDFProcessor
 from tools.web_search_tool import WEB_SEARCH_TOOLS, get_search_tool
 from tools.search_review_tool import REVIEW_TOOLS
+from tools.web_scraping_tool import close_web_scraper
+from executor import SHARED_EXECUTOR
 import re
 
-# 加载环境变量
-load_dotenv(override=True)
+# 环境变量在 config 模块导入时经 load_dotenv 注入（先于 Settings 构造）
+
+# uvloop：更快的 asyncio 事件循环实现，对 SSE + httpx 这类 I/O 密集负载
+# 提升明显（Windows 或未安装时静默回退默认循环）
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
-# 配置日志
-logger.add(settings.log_file, rotation="500 MB", level=settings.log_level)
+# 配置日志（加防重入标记，--reload / 重复导入时不再重复注册 handler）
+if not globals().get("_LOGGER_CONFIGURED"):
+    logger.add(settings.log_file, rotation="500 MB", level=settings.log_level)
+    _LOGGER_CONFIGURED = True
 
 app = FastAPI(
     title="多模态 RAG 工作台 API",
     description="基于 LangChain 1.0 的智能对话 API",
-    version="1.0.0"
+    version="1.0.0",
+    # JSON 端点默认走 orjson 序列化（orjson 缺省时退回 stdlib）
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
 )
 
 # CORS 配置
@@ -105,49 +134,333 @@ except ImportError as e:
     logger.warning(f"⚠️ 音频处理器导入失败: {e}")
     audio_processor = None
 
+# 流式帧共享的缓存时间戳：每100ms由后台任务刷新一次。
+# content_delta 等高频帧不再逐帧调用 datetime.now().isoformat()；
+# message_complete / 持久化等对精度敏感的位置仍取实时时间
+_NOW_ISO: str = datetime.now().isoformat()
+
+
+async def _refresh_now_iso() -> None:
+    global _NOW_ISO
+    while True:
+        _NOW_ISO = datetime.now().isoformat()
+        await asyncio.sleep(0.1)
+
+
+@app.on_event("startup")
+async def _start_timestamp_refresher():
+    asyncio.create_task(_refresh_now_iso())
+
+
+def _sse(obj: Dict[str, Any]) -> bytes:
+    """编码单帧 SSE 数据为预编码字节串。
+
+    流式输出时每个 token 都要走这里，orjson 的 C 实现比
+    stdlib json 快 5-10 倍且直接产出 UTF-8 字节，
+    StreamingResponse 对 bytes 零转换下发；orjson 缺省时退回 stdlib。
+    """
+    if orjson is not None:
+        return b"data: " + orjson.dumps(obj) + b"\n\n"
+    return ("data: " + json.dumps(obj, ensure_ascii=False) + "\n\n").encode("utf-8")
+
+
+def _make_hot_frame_encoder(event_type: str):
+    """为单一高频事件类型构造SSE编码器（content_delta / thought_process_content）。
+
+    帧里只有 content 逐 token 变化，type/timestamp 的静态部分预编码为
+    字节前缀，每个 token 只序列化 content 本身，省掉整帧的 dict 构建
+    与重新编码；时间戳跟随 _NOW_ISO，每次刷新（100ms）才重建前缀。
+    """
+    static_head = 'data: {"type":"' + event_type + '","timestamp":"'
+    state = {"ts": None, "prefix": b""}
+
+    def encode(content: str) -> bytes:
+        if orjson is None:
+            return _sse({"type": event_type, "content": content, "timestamp": _NOW_ISO})
+        if _NOW_ISO is not state["ts"]:
+            state["ts"] = _NOW_ISO
+            state["prefix"] = (static_head + _NOW_ISO + '","content":').encode("utf-8")
+        return state["prefix"] + orjson.dumps(content) + b"}\n\n"
+
+    return encode
+
+
+_content_delta_frame = _make_hot_frame_encoder("content_delta")
+_thought_content_frame = _make_hot_frame_encoder("thought_process_content")
+
+
+def _loads(data) -> Any:
+    """解析JSON（审查结果等大文本路径优先走orjson的C实现）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps_str(obj) -> str:
+    """序列化为str；orjson 缺省时退回 stdlib json"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+# 引用标记正则：[1]、[2] 等，预编译在模块级，避免每次响应重新编译
+# （括号内的 \d+ 本身已无歧义，原先两侧的标点字符类没有增加约束）
+_REF_RE = re.compile(r'\[(\d+)\]')
+
+
+@dataclass(slots=True)
+class PdfChunkView:
+    """PDF块的扁平视图。
+
+    前端传来的块是 dict 套 dict（metadata 嵌一层），热路径上每个引用
+    要做 4-5 次 .get 并为缺失键构造临时空字典；请求入口归一化一次后，
+    引用提取与上下文注入都只做属性访问。
+    """
+    content: str
+    source: str
+    page: int
+    chunk_id: int
+    source_info: str
+    snippet: str  # 截断到300字符的引用文本，归一化时算好
+
+
+def _normalize_pdf_chunks(raw: Optional[List[Dict[str, Any]]]) -> List[PdfChunkView]:
+    """在请求边界把原始PDF块归一化为 PdfChunkView 列表（每请求一次）"""
+    views = []
+    for i, c in enumerate(raw or (), 1):
+        metadata = c.get("metadata", {})
+        content = c.get("content", "")
+        views.append(PdfChunkView(
+            content=content,
+            source=metadata.get("source", "未知来源"),
+            page=metadata.get("page_number", 1),
+            chunk_id=metadata.get("chunk_id", 0),
+            source_info=metadata.get("source_info", f"文档块 {i}"),
+            # 引用文本截断到300字符，提供相对完整的信息；
+            # 一个块可能被同一回答引用多次，这里只算一次
+            snippet=content if len(content) <= 300 else content[:300] + "...",
+        ))
+    return views
+
+
 # 引用提取函数
-def extract_references_from_content(content: str, pdf_chunks: list = None) -> list:
+def extract_references_from_content(content: str, pdf_chunks: List[PdfChunkView] = None) -> list:
     """
-    从AI回答内容中提取引用信息
+    从AI回答内容中提取引用信息（pdf_chunks 为归一化后的块视图列表）
     """
     references = []
-    
-    # 查找所有的引用标记 [1], [2], etc.
-    # 使用更简单的正则表达式，避免匹配到普通文本中的数字
-    # 只匹配被空白字符或标点符号包围的引用标记
-    reference_pattern = r'[\s\[\](){}.,;:!?<>""''`~#$%^&*+=|\\/-]*\[(\d+)\][\s\[\](){}.,;:!?<>""''`~#$%^&*+=|\\/-]*'
-    matches = re.findall(reference_pattern, content)
-    
-    # 去重并保持顺序
-    unique_matches = []
-    for match in matches:
-        if match not in unique_matches:
-            unique_matches.append(match)
-    
-    if unique_matches and pdf_chunks:
-        for match in unique_matches:
-            ref_num = int(match)
-            if 1 <= ref_num <= len(pdf_chunks):
-                chunk = pdf_chunks[ref_num - 1]  # 索引从0开始
-                # 增加引用文本的长度到300字符，提供更完整的信息
-                reference = {
-                    "id": ref_num,
-                    "text": chunk.get("content", "")[:300] + "..." if len(chunk.get("content", "")) > 300 else chunk.get("content", ""),
-                    "source": chunk.get("metadata", {}).get("source", "未知来源"),
-                    "page": chunk.get("metadata", {}).get("page_number", 1),
-                    "chunk_id": chunk.get("metadata", {}).get("chunk_id", 0),
-                    "source_info": chunk.get("metadata", {}).get("source_info", "未知来源")
-                }
-                references.append(reference)
-    
+
+    # 流式扫描引用标记，dict 保序去重（O(n)，替代列表线性查重的 O(n²)）
+    seen = {}
+    for m in _REF_RE.finditer(content):
+        seen.setdefault(m.group(1), None)
+
+    if seen and pdf_chunks:
+        chunk_count = len(pdf_chunks)
+        # 快照文本已在归一化时截好，这里只剩索引与字典拼装
+        references = [
+            {
+                "id": n,
+                "text": v.snippet,
+                "source": v.source,
+                "page": v.page,
+                "chunk_id": v.chunk_id,
+                "source_info": v.source_info,
+            }
+            for n, v in (
+                (int(m), pdf_chunks[int(m) - 1])
+                for m in seen
+                if 1 <= int(m) <= chunk_count
+            )
+        ]
+
     return references
 
+# 全部工具（搜索 + 审查），tuple 便于缓存键哈希与只读共享
+_ALL_TOOLS = tuple(WEB_SEARCH_TOOLS) + tuple(REVIEW_TOOLS)
+
+# 名称→工具映射，工具调用时 O(1) 查找，替代每次线性扫描
+_TOOLS_BY_NAME = {getattr(t, "name", ""): t for t in _ALL_TOOLS}
+_REVIEW_TOOL = _TOOLS_BY_NAME.get("review_search_results")
+
+# 搜索类工具名的特征子串（命中则触发自动审查与搜索日志）
+_SEARCH_NAME_TOKENS = ("search", "web", "news")
+
+
+def _latest_user_question(messages: List[BaseMessage]) -> str:
+    """从消息尾部找最近的用户问题（同一批工具调用共享同一个答案）"""
+    for m in reversed(messages):
+        if isinstance(m, HumanMessage):
+            c = m.content
+            if isinstance(c, str):
+                return c
+            if isinstance(c, list):
+                parts = []
+                for item in c:
+                    if isinstance(item, dict) and item.get('type') == 'text':
+                        parts.append(item.get('text', ''))
+                    elif isinstance(item, str):
+                        parts.append(item)
+                return ' '.join(parts).strip()
+            return ""
+    return ""
+
+
+def _canonical_tool_key(tool_call: Dict) -> tuple:
+    """(工具名, 规范化参数JSON) —— 用于识别重复的工具调用"""
+    args = tool_call.get("args", {})
+    if orjson is not None:
+        canonical = orjson.dumps(args, option=orjson.OPT_SORT_KEYS)
+    else:
+        canonical = json.dumps(args, ensure_ascii=False, sort_keys=True)
+    return (tool_call.get("name"), canonical)
+
+
+# 内容块处理函数：按 type 分发，convert_history_to_messages 与
+# create_multimodal_message 共用，避免两处维护同一套 if/elif 链
+def _h_text_block(block: Dict[str, Any], out: List[Dict[str, Any]]) -> None:
+    out.append({"type": "text", "text": block.get("content", "")})
+
+
+def _h_image_block(block: Dict[str, Any], out: List[Dict[str, Any]]) -> None:
+    image_data = block.get("content", "")
+    if image_data.startswith("data:image"):
+        logger.opt(lazy=True).debug("添加图片块，数据长度: {}", lambda: len(image_data))
+        # 字典中保存的是对原字符串的引用，不复制 base64 负载；
+        # 日志里只允许出现长度或截断后的前缀，避免整段 base64 被物化
+        out.append({"type": "image_url", "image_url": {"url": image_data}})
+    else:
+        logger.warning(f"图片数据格式不正确: {image_data[:64]}...")
+
+
+def _h_audio_block(block: Dict[str, Any], out: List[Dict[str, Any]]) -> None:
+    # 音频内容块 - 直接使用转写文本
+    transcription = block.get("transcription", "")
+    if transcription:
+        out.append({"type": "text", "text": f"[音频转写] {transcription}"})
+    else:
+        logger.warning("音频块缺少转写文本")
+
+
+def _h_pdf_block(block: Dict[str, Any], out: List[Dict[str, Any]]) -> None:
+    # PDF内容块 - 使用文件名作为标识
+    out.append({
+        "type": "text",
+        "text": f"[PDF文档] {block.get('filename', '')} ({(block.get('filesize') or 0) / 1024:.1f} KB)"
+    })
+
+
+def _h_unknown_block(block: Dict[str, Any], out: List[Dict[str, Any]]) -> None:
+    logger.warning(f"未知内容块类型: {block.get('type')}")
+
+
+_BLOCK_HANDLERS = {
+    "text": _h_text_block,
+    "image": _h_image_block,
+    "audio": _h_audio_block,
+    "pdf": _h_pdf_block,
+}
+
+
+# LLM 响应缓存：键为 (消息序列, PDF块, 模型, 工具开关) 的哈希，
+# 值为 (SSE帧列表, 完整回答, 引用)。命中时原样回放帧，省掉一次完整生成。
+# 含工具调用的轮次不缓存（搜索结果有时效性）；cachetools 缺省时禁用
+_LLM_CACHE = TTLCache(maxsize=1024, ttl=3600) if TTLCache is not None else None
+
+
+def _llm_cache_key(
+    messages: List[BaseMessage],
+    model_name: str,
+    enable_tools: bool,
+    pdf_chunks: Optional[List[Dict[str, Any]]],
+) -> Optional[bytes]:
+    """计算响应缓存键；缓存不可用或内容不可序列化时返回 None"""
+    if _LLM_CACHE is None:
+        return None
+    try:
+        snapshot = [[m.type, m.content] for m in messages]
+        if orjson is not None:
+            payload = orjson.dumps(snapshot, default=str)
+            pdf_payload = orjson.dumps(pdf_chunks) if pdf_chunks else b""
+        else:
+            payload = json.dumps(snapshot, ensure_ascii=False, default=str).encode("utf-8")
+            pdf_payload = json.dumps(pdf_chunks, ensure_ascii=False).encode("utf-8") if pdf_chunks else b""
+        h = hashlib.blake2b(payload, digest_size=16)
+        h.update(pdf_payload)
+        h.update((model_name or "").encode("utf-8"))
+        h.update(b"1" if enable_tools else b"0")
+        return h.digest()
+    except Exception:
+        return None
+
+
+def _log_persist_failure(task: "asyncio.Task") -> None:
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.warning(f"会话写入失败: {exc}")
+
+
+def _persist_message_async(session_id: str, message: Dict[str, Any]) -> None:
+    """把会话写入调度到线程池，文件 I/O 不再阻塞事件循环与 SSE 下发"""
+    task = asyncio.create_task(asyncio.to_thread(append_message, session_id, message))
+    task.add_done_callback(_log_persist_failure)
+
+
+def _persist_messages_async(session_id: str, batch: List[Dict[str, Any]]) -> None:
+    """批量版本：一问一答等多条消息合并成一次存储调用"""
+    task = asyncio.create_task(asyncio.to_thread(append_messages, session_id, batch))
+    task.add_done_callback(_log_persist_failure)
+
+
+def _pdf_context_message(pdf_chunks: List[PdfChunkView]) -> SystemMessage:
+    """将归一化后的PDF块格式化为一条独立的上下文系统消息。
+
+    不再把PDF文本原地拼进 messages[0].content：基础系统提示词保持
+    逐字节不变，供应商侧的 prompt cache 才能命中；PDF 上下文作为
+    第二条系统消息注入，文本用一次 join 构建，避免 O(n²) 字符串增长。
+    """
+    pdf_content = "".join(
+        f"\n[{i}] {v.content[:500]}\n来源: {v.source_info}\n"
+        for i, v in enumerate(pdf_chunks, 1)
+    )
+    return SystemMessage(content="\n\n=== 参考文档内容 ===\n" + pdf_content)
+
+
+# 进程级共享的异步 HTTP 客户端：所有模型实例复用同一个连接池，
+# 开启 HTTP/2 多路复用，避免每个模型实例各建一套连接与 TLS 握手
+_HTTP_ASYNC_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+)
+
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    await _HTTP_ASYNC_CLIENT.aclose()
+    await close_web_scraper()
+    await get_search_tool().aclose()
+    SHARED_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
 # 初始化聊天模型
 def get_chat_model(model_name: str = None):
-    """初始化聊天模型"""
+    """初始化聊天模型（实例按模型名缓存复用，见 _build_chat_model）"""
     if model_name is None:
         model_name = settings.default_model# 如果模型名字是空就默认为"deepseek-chat"
+    return _build_chat_model(model_name)
 
+
+@lru_cache(maxsize=8)
+def _build_chat_model(model_name: str):
+    """按模型名构建并缓存聊天模型实例。
+
+    ChatOpenAI/ChatDeepSeek 对并发 ainvoke/astream 是安全的，
+    复用同一实例可以共享底层 httpx 连接池，省掉每个请求的
+    客户端构建和 TLS 握手开销。
+    """
     try:
         # 根据模型名称选择不同的API配置
         if model_name == "qwen3-vl-8b-instruct":
@@ -158,7 +471,8 @@ def get_chat_model(model_name: str = None):
                 base_url=settings.modelscope_base_url,
                 temperature=settings.temperature,
                 max_tokens=settings.max_tokens,
-                streaming=True
+                streaming=True,
+                http_async_client=_HTTP_ASYNC_CLIENT
             )
         else:
             # 使用原有的DeepSeek配置
@@ -168,7 +482,8 @@ def get_chat_model(model_name: str = None):
                 base_url=settings.openai_base_url,
                 temperature=settings.temperature,
                 max_tokens=settings.max_tokens,
-                streaming=True
+                streaming=True,
+                http_async_client=_HTTP_ASYNC_CLIENT
             )
         return model
     except Exception as e:
@@ -176,206 +491,217 @@ def get_chat_model(model_name: str = None):
         raise HTTPException(status_code=500, detail=f"模型初始化失败: {str(e)}")
 
 def get_chat_model_with_tools(model_name: str = None, enable_tools: bool = True):
-    """初始化带工具的聊天模型"""
+    """初始化带工具的聊天模型（按 (model_name, enable_tools) 缓存绑定结果）"""
+    if model_name is None:
+        model_name = settings.default_model
+    return _build_chat_model_with_tools(model_name, enable_tools)
+
+
+@lru_cache(maxsize=8)
+def _build_chat_model_with_tools(model_name: str, enable_tools: bool):
+    """构建并缓存绑定工具后的模型，避免每个请求重复序列化工具 schema"""
     model = get_chat_model(model_name)
-    
+
     # 只有 deepseek-chat 支持工具调用，reasoner 和视觉模型不支持
-    if enable_tools and model_name in ["deepseek-chat", None]:
+    if enable_tools and model_name == "deepseek-chat":
         try:
-            # 合并所有工具（搜索工具 + 审查工具）
-            all_tools = list(WEB_SEARCH_TOOLS) + list(REVIEW_TOOLS)
-            model_with_tools = model.bind_tools(all_tools)
-            logger.info(f"✅ 已为模型 {model_name} 绑定 {len(all_tools)} 个工具")
+            model_with_tools = model.bind_tools(list(_ALL_TOOLS))
+            logger.info(f"✅ 已为模型 {model_name} 绑定 {len(_ALL_TOOLS)} 个工具")
             return model_with_tools
         except Exception as e:
             logger.warning(f"⚠️ 工具绑定失败: {e}，返回原始模型")
             return model
-    
+
     logger.info(f"ℹ️ 模型 {model_name} 不支持工具调用或工具已禁用")
     return model
 
-async def execute_tool_calls(tool_calls: List[Dict], messages: List[BaseMessage]) -> List[BaseMessage]:
-    """执行工具调用并返回结果。 
+
+def reset_model_cache():
+    """清空模型实例缓存（配置热更新后调用）"""
+    _build_chat_model.cache_clear()
+    _build_chat_model_with_tools.cache_clear()
+
+async def execute_tool_calls_streaming(
+    tool_calls: List[Dict],
+    messages: List[BaseMessage],
+    result_cache: Optional[Dict[tuple, str]] = None,
+) -> AsyncGenerator[BaseMessage, None]:
+    """并发执行工具调用，按完成顺序逐条产出 ToolMessage。
 
     说明：在搜索类工具执行后，自动调用 `review_search_results` 审查工具，
-    并将审查结果作为额外的 ToolMessage 一并返回。
+    并将审查结果合并进对应的 ToolMessage。
+
+    同一轮内的多个工具调用彼此独立（典型为搜索/新闻类 I/O），
+    全部并发调度并用 Semaphore 限制扇出避免压垮搜索后端；
+    asyncio.as_completed 让最快的工具结果先到达调用方，
+    首个可见结果的等待时间从 max(各工具延迟) 降为 min(各工具延迟)。
     """
-    tool_messages = []
+    semaphore = asyncio.Semaphore(settings.tool_concurrency_limit or 4)
 
-    # 合并所有工具，包含搜索工具与审查工具
-    all_tools = list(WEB_SEARCH_TOOLS) + (list(REVIEW_TOOLS) if 'REVIEW_TOOLS' in globals() else [])
+    # 最近的用户问题对整批工具调用都一样，只扫一次消息尾部
+    user_question = _latest_user_question(messages)
 
-    for tool_call in tool_calls:
+    async def _run_one(tool_call: Dict) -> Optional[BaseMessage]:
         tool_name = tool_call.get("name")
         tool_args = tool_call.get("args", {})
         tool_id = tool_call.get("id")
+        lower_name = (tool_name or "").lower()
+        is_search_tool = any(k in lower_name for k in _SEARCH_NAME_TOKENS)
 
         logger.info(f"🔧 执行工具: {tool_name}, 参数: {tool_args}")
 
-        # 在所有工具中查找
-        tool_func = None
-        for tool in all_tools:
-            if getattr(tool, 'name', None) == tool_name:
-                tool_func = tool
-                break
+        # O(1) 名称查找
+        tool_func = _TOOLS_BY_NAME.get(tool_name)
 
         if not tool_func:
             logger.warning(f"⚠️ 未找到工具: {tool_name}")
-            continue
+            return None
+
+        # 同一会话轮内参数完全相同的调用直接复用缓存结果，省掉整个往返
+        cache_key = _canonical_tool_key(tool_call) if result_cache is not None else None
+        if cache_key is not None:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"♻️ 工具[{tool_name}] 参数与先前调用相同，复用缓存结果")
+                return ToolMessage(content=cached, tool_call_id=tool_id, name=tool_name)
 
         try:
-            # 执行工具
-            result = await tool_func.ainvoke(tool_args)
+            # 执行工具（限流，避免同一轮大量工具同时打到搜索后端）
+            async with semaphore:
+                result = await tool_func.ainvoke(tool_args)
             logger.info(f"✅ 工具执行成功: {tool_name}")
 
             # 如果是搜索类工具，记录搜索引擎和搜索摘要到日志，完整结果作为 debug
             try:
-                lower_name = (tool_name or "").lower()
-                if "search" in lower_name or "web" in lower_name or "news" in lower_name:
+                if is_search_tool:
                     # 尝试记录当前使用的搜索引擎
                     try:
                         current_engine = get_search_tool().search_engine
                         logger.info(f"🔎 工具[{tool_name}] 使用搜索引擎: {current_engine}")
                     except Exception:
                         logger.debug(f"无法确定工具[{tool_name}] 使用的搜索引擎")
-                    result_text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+                    result_text = result if isinstance(result, str) else _dumps_str(result)
                     summary = result_text[:400] + ("..." if len(result_text) > 400 else "")
                     logger.info(f"🔎 工具[{tool_name}] 返回（摘要）: {summary}")
                     logger.debug(f"🔎 工具[{tool_name}] 返回（完整）: {result_text}")
             except Exception:
                 logger.debug(f"🔎 无法为工具[{tool_name}] 生成搜索摘要")
 
-            # 如果这是搜索类工具，尝试自动调用审查工具并将审查结果合并到工具消息中
-            review_text = None
+            # 如果这是搜索类工具，尝试自动调用审查工具并将审查结果合并到工具消息中。
+            # 审查调用先调度为后台任务（create_task），与同批次其他工具的执行重叠，
+            # 只在真正需要审查输出时才 await，让审查尽量不占关键路径
+            review_future = None
+            try:
+                if is_search_tool and _REVIEW_TOOL is not None:
+                    review_args = {
+                        'formatted_results': str(result),
+                        'user_question': user_question or '',
+                        'current_date': datetime.now().strftime('%Y-%m-%d')
+                    }
+                    logger.info(f"🔍 自动调用审查工具: review_search_results")
+                    review_future = asyncio.create_task(_REVIEW_TOOL.ainvoke(review_args))
+            except Exception as e:
+                logger.error(f"审查工具调度失败: {e}")
+
+            # 此处才等待审查结果；任务失败/被取消时保留原始搜索结果
             try:
-                lower_name = (tool_name or "").lower()
-                if any(k in lower_name for k in ["search", "web", "news"]):
-                    # 从历史消息中找到最近的用户问题
-                    user_question = ""
-                    for m in reversed(messages):
-                        if isinstance(m, HumanMessage):
-                            c = m.content
-                            if isinstance(c, list):
-                                parts = []
-                                for item in c:
-                                    if isinstance(item, dict) and item.get('type') == 'text':
-                                        parts.append(item.get('text', ''))
-                                    elif isinstance(item, str):
-                                        parts.append(item)
-                                user_question = ' '.join(parts).strip()
-                            elif isinstance(c, str):
-                                user_question = c
-                            break
-
-                    # 查找审查工具
-                    review_tool = None
-                    for t in all_tools:
-                        if getattr(t, 'name', '') == 'review_search_results':
-                            review_tool = t
-                            break
-
-                    if review_tool:
-                        review_args = {
-                            'formatted_results': str(result),
-                            'user_question': user_question or '',
-                            'current_date': datetime.now().strftime('%Y-%m-%d')
-                        }
-                        logger.info(f"🔍 自动调用审查工具: review_search_results")
-                        review_result = await review_tool.ainvoke(review_args)
-                        logger.info(f"✅ 审查工具执行完成")
-                        review_text = str(review_result)
-
-                        # 尝试解析审查结果并筛选原始结果
-                        try:
-                            review_json = json.loads(review_result)
-                            recommendations = review_json.get('recommendations', [])
-                            entries = review_json.get('entries', [])
-                            
-                            # 如果有推荐列表，筛选出推荐的条目
-                            if recommendations and entries:
-                                # 构建索引映射
-                                entry_map = {e['index']: e for e in entries}
-                                
-                                # 获取推荐的条目，最多取前10个
-                                final_entries = []
-                                for idx in recommendations[:10]:
-                                    if idx in entry_map:
-                                        final_entries.append(entry_map[idx])
-                                
-                                # 如果推荐不足，补充高分结果直到10条
-                                if len(final_entries) < 10:
-                                    existing_indices = set(e['index'] for e in final_entries)
-                                    # 按分数排序
-                                    sorted_entries = sorted(entries, key=lambda x: x.get('final_score', 0), reverse=True)
-                                    for e in sorted_entries:
-                                        if len(final_entries) >= 10:
-                                            break
-                                        if e['index'] not in existing_indices:
-                                            final_entries.append(e)
-                                            existing_indices.add(e['index'])
-                                
-                                # 重新格式化为文本
-                                if final_entries:
-                                    new_result_text = "🔍 经审查筛选后的搜索结果：\n\n"
-                                    for i, entry in enumerate(final_entries, 1):
-                                        title = entry.get('title', '无标题')
-                                        snippet = entry.get('snippet', '无描述')
-                                        url = entry.get('url', '')
-                                        source = entry.get('source', '未知来源')
-                                        reasons = entry.get('reasons', [])
-                                        
-                                        new_result_text += f"[{i}] {title}\n"
-                                        new_result_text += f"📝 {snippet}\n"
-                                        if url:
-                                            new_result_text += f"🔗 {url}\n"
-                                        new_result_text += f"📍 来源: {source}\n"
-                                        if reasons:
-                                            new_result_text += f"💡 推荐理由: {', '.join(reasons)}\n"
-                                        new_result_text += "\n"
-                                    
-                                    # 更新 result 为筛选后的文本
-                                    result = new_result_text
-                                    logger.info(f"✅ 已根据审查结果筛选出 {len(final_entries)} 条高相关结果")
-                        except Exception as parse_err:
-                            logger.warning(f"⚠️ 解析审查结果失败，保留原始结果: {parse_err}")
+                if review_future is not None:
+                    review_result = await review_future
+                    logger.info(f"✅ 审查工具执行完成")
 
+                    # 尝试解析审查结果并筛选原始结果
+                    try:
+                        review_json = _loads(review_result)
+                        recommendations = review_json.get('recommendations', [])
+                        entries = review_json.get('entries', [])
+                        
+                        # 如果有推荐列表，筛选出推荐的条目
+                        if recommendations and entries:
+                            # 构建索引映射
+                            entry_map = {e['index']: e for e in entries}
+
+                            # 获取推荐的条目，最多取前10个
+                            final_entries = []
+                            for idx in recommendations[:10]:
+                                if idx in entry_map:
+                                    final_entries.append(entry_map[idx])
+
+                            # 如果推荐不足，用 nlargest 补充高分结果直到10条
+                            # （只需 top-k，O(n log k)，不用为此排序整个列表）
+                            needed = 10 - len(final_entries)
+                            if needed > 0:
+                                existing_indices = {e['index'] for e in final_entries}
+                                final_entries.extend(heapq.nlargest(
+                                    needed,
+                                    (e for e in entries if e['index'] not in existing_indices),
+                                    key=lambda e: e.get('final_score', 0)
+                                ))
+
+                            # 重新格式化为文本（列表收集 + 一次 join）
+                            if final_entries:
+                                parts = ["🔍 经审查筛选后的搜索结果：\n\n"]
+                                for i, entry in enumerate(final_entries, 1):
+                                    title = entry.get('title', '无标题')
+                                    snippet = entry.get('snippet', '无描述')
+                                    url = entry.get('url', '')
+                                    source = entry.get('source', '未知来源')
+                                    reasons = entry.get('reasons', [])
+
+                                    parts.append(f"[{i}] {title}\n📝 {snippet}\n")
+                                    if url:
+                                        parts.append(f"🔗 {url}\n")
+                                    parts.append(f"📍 来源: {source}\n")
+                                    if reasons:
+                                        parts.append(f"💡 推荐理由: {', '.join(reasons)}\n")
+                                    parts.append("\n")
+
+                                # 更新 result 为筛选后的文本
+                                result = "".join(parts)
+                                logger.info(f"✅ 已根据审查结果筛选出 {len(final_entries)} 条高相关结果")
+                    except Exception as parse_err:
+                        logger.warning(f"⚠️ 解析审查结果失败，保留原始结果: {parse_err}")
+
+            except asyncio.CancelledError:
+                logger.warning("⚠️ 审查任务被取消，保留原始搜索结果")
             except Exception as e:
                 logger.error(f"审查工具调用失败: {e}")
 
             # 创建工具消息：如果有审查结果，将其合并到搜索结果内容中
             # 注意：如果上面已经更新了 result 为筛选后的文本，这里直接使用即可
-            # 审查详情（review_text）可以选择是否附加，为了保持简洁，如果筛选成功，可以只返回筛选后的结果
-            # 或者将审查元数据作为补充信息
-            
             combined_content = str(result)
-            # 如果需要调试审查过程，可以取消下面注释
-            # if review_text:
-            #     combined_content = combined_content + "\n\n[REVIEW_DEBUG]\n" + review_text
+            if cache_key is not None:
+                result_cache[cache_key] = combined_content
 
-            tool_message = ToolMessage(
+            return ToolMessage(
                 content=combined_content,
                 tool_call_id=tool_id,
                 name=tool_name
             )
-            tool_messages.append(tool_message)
         except Exception as e:
             logger.error(f"❌ 工具执行失败: {tool_name}, 错误: {e}")
-            tool_message = ToolMessage(
+            return ToolMessage(
                 content=f"工具执行失败: {str(e)}",
                 tool_call_id=tool_id,
                 name=tool_name
             )
-            tool_messages.append(tool_message)
 
-    return tool_messages
+    # 全部并发调度；K 个独立 I/O 的总耗时从 Σ延迟 降为 max延迟，
+    # as_completed 保证最快完成的先产出（_run_one 内部已兜底异常）
+    tasks = [asyncio.ensure_future(_run_one(tc)) for tc in tool_calls]
+    for fut in asyncio.as_completed(tasks):
+        tool_message = await fut
+        if tool_message is not None:
+            yield tool_message
 
-def convert_history_to_messages(history: List[Dict[str, Any]], model_name: str = None) -> List[BaseMessage]:
-    """将历史记录转换为 LangChain 消息格式，支持多模态内容"""
-    messages = []
-    
-    # 添加系统消息
-    if model_name == "deepseek-reasoner":
-        system_prompt = """你是一个专业、严谨的多模态 RAG 助手（可按需展示推理过程）。请严格遵守下列规范以保证回答的专业性：
+
+async def execute_tool_calls(tool_calls: List[Dict], messages: List[BaseMessage]) -> List[BaseMessage]:
+    """执行工具调用并一次性返回全部结果（streaming 版本的收集封装）"""
+    return [tm async for tm in execute_tool_calls_streaming(tool_calls, messages)]
+
+# 系统提示词常量：文本和 SystemMessage 实例都在模块级构建一次。
+# 每次请求直接复用同一实例（chunk 注入已改为独立消息，不会原地修改 content），
+# 省掉每请求约 2KB 的字符串与消息对象分配
+_SYS_REASONER = SystemMessage(content="""你是一个专业、严谨的多模态 RAG 助手（可按需展示推理过程）。请严格遵守下列规范以保证回答的专业性：
 
 一、职责与能力
 - 熟练进行文档理解、图像与音频分析、知识检索与逻辑推理；
@@ -404,9 +730,9 @@ def convert_history_to_messages(history: List[Dict[str, Any]], model_name: str =
 六、交互和澄清
 - 若用户问题含糊或缺重要上下文，先礼貌提问以澄清（列出需要补充的信息）；
 
-始终以专业、可审计、可复现的方式生成回答。"""
-    else:
-        system_prompt = """你是一个专业、严谨的多模态 RAG 助手（常规模式，不展示内部思维链）。请严格遵守以下规范以确保回答专业：
+始终以专业、可审计、可复现的方式生成回答。""")
+
+_SYS_DEFAULT = SystemMessage(content="""你是一个专业、严谨的多模态 RAG 助手（常规模式，不展示内部思维链）。请严格遵守以下规范以确保回答专业：
 
 一、职责与能力
 - 熟练进行文档解读、图像 OCR 与分析、音频转写理解与知识检索；
@@ -427,180 +753,297 @@ def convert_history_to_messages(history: List[Dict[str, Any]], model_name: str =
 五、澄清请求
 - 若问题不够明确或缺关键信息，先提出 1-2 个简短澄清问题再继续处理。
 
-始终保持专业、客观，并确保回答中有明确的不确定性说明。"""
-    
-    messages.append(SystemMessage(content=system_prompt))
-    
+始终保持专业、客观，并确保回答中有明确的不确定性说明。""")
+
+
+def convert_history_to_messages(history: List[Dict[str, Any]], model_name: str = None) -> List[BaseMessage]:
+    """将历史记录转换为 LangChain 消息格式，支持多模态内容"""
+    messages = [_SYS_REASONER if model_name == "deepseek-reasoner" else _SYS_DEFAULT]
+
     # 转换历史消息
     logger.info(f"处理历史消息: {len(history)} 条")
     for i, msg in enumerate(history):
         content = msg.get("content", "")
         content_blocks = msg.get("content_blocks", [])
-        logger.info(f"历史消息 {i+1}: {msg['role']}, 内容块数: {len(content_blocks)}, 音频转写: {any(b.get('transcription') for b in content_blocks)}")
-        
+        # 逐条日志走 lazy debug：DEBUG 关闭时不构造字符串、不扫描内容块
+        logger.opt(lazy=True).debug(
+            "历史消息 {}",
+            lambda i=i, msg=msg, blocks=content_blocks: (
+                f"{i + 1}: {msg['role']}, 内容块数: {len(blocks)}, "
+                f"音频转写: {any(b.get('transcription') for b in blocks)}"
+            ),
+        )
+
         if msg["role"] == "user":
             # 如果有多模态内容块，构建复合消息
             if content_blocks:
                 message_content = []
-                
+
                 # 添加文本内容（如果有）
                 if content.strip():
                     message_content.append({
                         "type": "text",
                         "text": content
                     })
-                
-                # 处理内容块
+
+                # 按类型分发到共享的内容块处理函数
                 for block in content_blocks:
-                    if block.get("type") == "text":
-                        message_content.append({
-                            "type": "text", 
-                            "text": block.get("content", "")
-                        })
-                    elif block.get("type") == "image":
-                        # 图片内容块
-                        image_data = block.get("content", "")
-                        if image_data.startswith("data:image"):
-                            message_content.append({
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": image_data
-                                }
-                            })
-                    elif block.get("type") == "audio":
-                        # 音频内容块 - 使用转写文本
-                        if block.get("transcription"):
-                            message_content.append({
-                                "type": "text",
-                                "text": f"[音频转写] {block.get('transcription')}"
-                            })
-                
+                    _BLOCK_HANDLERS.get(block.get("type"), _h_unknown_block)(block, message_content)
+
                 messages.append(HumanMessage(content=message_content))
             else:
                 # 纯文本消息
                 messages.append(HumanMessage(content=content))
-                
+
         elif msg["role"] == "assistant":
             messages.append(AIMessage(content=content))
-    
+
     return messages
 
 def create_multimodal_message(request: MessageRequest) -> HumanMessage:
     """创建多模态消息"""
-    logger.info(f"开始构建多模态消息...")
-    logger.info(f"文本内容: {request.content[:100]}..." if request.content else "📝 无文本内容")
-    logger.info(f"内容块数量: {len(request.content_blocks)}")
-    
+    logger.debug(f"开始构建多模态消息，内容块数量: {len(request.content_blocks)}")
+
     message_content = []
-    
+
     # 添加文本内容（如果有）
     if request.content.strip():
-        logger.info(f"添加文本内容")
         message_content.append({
             "type": "text",
             "text": request.content
         })
-    
-    # 处理内容块
-    for i, block in enumerate(request.content_blocks):
-        logger.info(f"处理内容块 {i+1}/{len(request.content_blocks)}: {block.type}")
-        
-        if block.type == "text":
-            logger.info(f"添加文本块: {block.content[:50]}...")
-            message_content.append({
-                "type": "text",
-                "text": block.content
-            })
-        elif block.type == "image":
-            # 图片内容块
-            if block.content.startswith("data:image"):
-                logger.info(f"添加图片块，数据长度: {len(block.content)}")
-                message_content.append({
-                    "type": "image_url", 
-                    "image_url": {
-                        "url": block.content
-                    }
-                })
-            else:
-                logger.warning(f"图片数据格式不正确: {block.content[:50]}...")
-        elif block.type == "audio":
-            # 音频内容块 - 直接使用转写文本
-            if block.transcription:
-                logger.info(f"添加音频转写文本: {block.transcription[:50]}...")
-                message_content.append({
-                    "type": "text",
-                    "text": f"[音频转写] {block.transcription}"
-                })
-            else:
-                logger.warning(f"音频块缺少转写文本")
-        elif block.type == "pdf":
-            # PDF内容块 - 使用文件名作为标识
-            logger.info(f"添加PDF块: {block.filename}")
-            message_content.append({
-                "type": "text", 
-                "text": f"[PDF文档] {block.filename} ({(block.filesize or 0) / 1024:.1f} KB)"
-            })
-        else:
-            logger.warning(f"未知内容块类型: {block.type}")
-    
-    logger.info(f"消息构建完成，内容块数量: {len(message_content)}")
-    
+
+    # 按类型分发到共享的内容块处理函数
+    for block in request.content_blocks:
+        _BLOCK_HANDLERS.get(block.type, _h_unknown_block)(block.dict(), message_content)
+
+    logger.debug(f"消息构建完成，内容块数量: {len(message_content)}")
+
     # 如果只有纯文本，直接返回字符串
     if len(message_content) == 1 and message_content[0]["type"] == "text":
-        logger.info(f"返回纯文本消息")
         return HumanMessage(content=message_content[0]["text"])
-    
+
     # 多模态消息
-    logger.info(f"返回多模态消息")
     return HumanMessage(content=message_content)
 
+# astream 生产者任务的结束哨兵
+_STREAM_DONE = object()
+
+
+async def _pump_astream(model, messages: List[BaseMessage], queue: asyncio.Queue) -> None:
+    """单一生产者任务：把 model.astream 的块灌进有界队列。
+
+    上游客户端逐块跨线程派发时，独立任务 + 队列把派发边界收敛到
+    生产者一侧，消费端按队列节奏下发 SSE，延迟更平滑；队列上限
+    提供背压。异常对象直接入队，由消费端重抛走原有错误路径。
+    """
+    try:
+        async for chunk in model.astream(messages):
+            await queue.put(chunk)
+    except Exception as exc:
+        await queue.put(exc)
+        return
+    await queue.put(_STREAM_DONE)
+
+
 async def generate_streaming_response_with_tools(
-    messages: List[BaseMessage], 
+    messages: List[BaseMessage],
     model_name: str,
     pdf_chunks: List[Dict[str, Any]] = None,
     enable_tools: bool = True,
     max_iterations: int = 5,
     session_id: Optional[str] = None
-) -> AsyncGenerator[str, None]:
-    """生成支持工具调用的流式响应"""
+) -> AsyncGenerator[bytes, None]:
+    """生成支持工具调用的流式响应（带幂等轮次的响应缓存）。
+
+    相同的 (消息序列, PDF块, 模型, 工具开关) 命中缓存时直接回放
+    已编码的 SSE 帧，不再调用模型；只有未发生工具调用且正常完成的
+    轮次才会写入缓存（搜索类结果有时效性，不适合回放）。
+    """
+    # session_init 帧与会话绑定，先于缓存逻辑发送且不参与缓存
+    if session_id:
+        yield _sse({"type": "session_init", "session_id": session_id})
+
+    cache_key = _llm_cache_key(messages, model_name, enable_tools, pdf_chunks)
+    if cache_key is not None:
+        cached = _LLM_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info("⚡ LLM 响应缓存命中，回放缓存帧")
+            frames, full_response, references = cached
+            for frame in frames:
+                yield frame
+            if session_id:
+                _persist_message_async(session_id, {
+                    "role": "assistant",
+                    "content": full_response,
+                    "references": references,
+                    "timestamp": datetime.now().isoformat()
+                })
+            return
+
+    # 请求边界归一化PDF块，后续热路径都用属性访问
+    chunk_views = _normalize_pdf_chunks(pdf_chunks)
+
+    state: Dict[str, Any] = {"tool_rounds": 0, "error": False,
+                             "full_response": "", "references": []}
+    frames: List[bytes] = []
+    async for frame in _generate_with_tools_uncached(
+        messages, model_name, chunk_views, enable_tools, max_iterations, session_id, state
+    ):
+        frames.append(frame)
+        yield frame
+
+    if cache_key is not None and not state["error"] and state["tool_rounds"] == 0:
+        _LLM_CACHE[cache_key] = (frames, state["full_response"], state["references"])
+
+
+async def _generate_with_tools_uncached(
+    messages: List[BaseMessage],
+    model_name: str,
+    pdf_chunks: List[PdfChunkView],
+    enable_tools: bool,
+    max_iterations: int,
+    session_id: Optional[str],
+    state: Dict[str, Any],
+) -> AsyncGenerator[bytes, None]:
+    """实际执行工具循环与流式生成；经由 state 回传缓存所需的元信息"""
     try:
         logger.info(f"🚀 开始生成流式响应（支持工具），模型: {model_name}")
         logger.info(f"📊 消息数量: {len(messages)}, 工具启用: {enable_tools}")
-        
-        # 如果有PDF内容，将其添加到系统消息中
+
+        # 如果有PDF内容，作为第二条系统消息注入（基础系统提示词保持不变）
         if pdf_chunks and len(pdf_chunks) > 0:
             logger.info(f"📚 检测到 {len(pdf_chunks)} 个PDF块，添加到上下文中")
-            pdf_content = "\n\n=== 参考文档内容 ===\n"
-            for i, chunk in enumerate(pdf_chunks, 1):
-                content = chunk.get("content", "")[:500]
-                source_info = chunk.get("metadata", {}).get("source_info", f"文档块 {i}")
-                pdf_content += f"\n[{i}] {content}\n来源: {source_info}\n"
-            
             if messages and isinstance(messages[0], SystemMessage):
-                messages[0].content += pdf_content
-                logger.info(f"✅ 已将PDF内容添加到系统提示词中")
-        
+                messages.insert(1, _pdf_context_message(pdf_chunks))
+                logger.info(f"✅ 已将PDF内容注入为独立系统消息")
+
         # 获取带工具的模型
         model = get_chat_model_with_tools(model_name, enable_tools)
         logger.info(f"✅ 模型初始化完成")
-        # 如果提供了 session_id，先通知前端该会话ID（用于前端持久化）
-        if session_id:
-            session_init = {"type": "session_init", "session_id": session_id}
-            yield f"data: {json.dumps(session_init, ensure_ascii=False)}\n\n"
-        
-        # 工具调用循环
+
+        # 工具调用循环：每轮只走一次 astream——
+        # token 边到边下发，同时把 chunk 聚合成完整的 AIMessageChunk，
+        # 流结束后从聚合消息的 tool_calls 判断是否还需要工具轮。
+        # 最终回答就是最后一轮流出的内容，不再额外 ainvoke 一次模型
+        # （内容片段先收集到列表，流结束后一次 join——跨 yield 边界的
+        # str += 享受不到 CPython 的原地拼接优化，长回答下是 O(n²)）
+        response_parts: List[str] = []
+
+        # 增量内容按 大小/时间 合并下发：凑满64字符或距上次冲刷超过
+        # 50ms 才发一帧。长回答从数千个逐token帧降到几十帧，省掉
+        # 每token一次的序列化和生成器恢复，50ms内的合并肉眼无感
+        delta_parts: List[str] = []
+        delta_len = 0
+        last_flush = time.monotonic()
+
+        is_reasoner_model = model_name == "deepseek-reasoner"
+        thought_process_started = False
+        thought_process_ended = False
+        answer_started = False
+
+        # 工具调用去重状态：键集合识别重复轮次，缓存让相同参数的调用免去往返
+        seen_calls: set = set()
+        tool_result_cache: Dict[tuple, str] = {}
+
         iteration = 0
         while iteration < max_iterations:
             iteration += 1
             logger.info(f"🔄 第 {iteration} 轮调用")
-            
-            # 先调用一次获取响应
-            response = await model.ainvoke(messages)
-            
-            # 检查是否有工具调用
-            if hasattr(response, 'tool_calls') and response.tool_calls:
-                logger.info(f"🔧 检测到 {len(response.tool_calls)} 个工具调用")
-                
+
+            accumulated = None
+            chunk_count = 0
+            # 生产者任务拉流入队，这里只消费；见 _pump_astream
+            stream_queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+            producer = asyncio.create_task(_pump_astream(model, messages, stream_queue))
+            try:
+                while True:
+                    chunk = await stream_queue.get()
+                    if chunk is _STREAM_DONE:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    chunk_count += 1
+                    logger.opt(lazy=True).debug("收到第 {} 个chunk", lambda: chunk_count)
+                    accumulated = chunk if accumulated is None else accumulated + chunk
+
+                    # 对于reasoner模型，特殊处理思维链
+                    # （getattr 一次取到局部变量，省掉 hasattr + 二次属性查找）
+                    extra = getattr(chunk, "additional_kwargs", None) if is_reasoner_model else None
+                    if extra:
+                        reasoning_content = extra.get("reasoning_content")
+                        if reasoning_content:
+                            if not thought_process_started:
+                                thought_process_started = True
+                                thought_data = {
+                                    "type": "thought_process_start",
+                                    "timestamp": _NOW_ISO
+                                }
+                                yield _sse(thought_data)
+
+                            yield _thought_content_frame(reasoning_content)
+                            continue
+
+                    # 处理普通内容块
+                    content = getattr(chunk, "content", None)
+                    if content:
+
+                        # 如果是reasoner模型且已经开始思维过程但还没结束，则发送思维过程结束信号
+                        if is_reasoner_model and thought_process_started and not thought_process_ended:
+                            thought_process_ended = True
+                            thought_end_data = {
+                                "type": "thought_process_end",
+                                "timestamp": _NOW_ISO
+                            }
+                            yield _sse(thought_end_data)
+
+                        # 如果还没开始发送答案，则发送答案开始信号
+                        if not answer_started:
+                            answer_started = True
+                            answer_start_data = {
+                                "type": "answer_start",
+                                "timestamp": _NOW_ISO
+                            }
+                            yield _sse(answer_start_data)
+
+                        response_parts.append(content)
+                        delta_parts.append(content)
+                        delta_len += len(content)
+                        now = time.monotonic()
+                        if delta_len >= 64 or now - last_flush > 0.05:
+                            yield _content_delta_frame("".join(delta_parts))
+                            delta_parts.clear()
+                            delta_len = 0
+                            last_flush = now
+            finally:
+                # 客户端断连/异常时取消生产者，避免任务泄漏
+                if not producer.done():
+                    producer.cancel()
+
+            # 本轮拉流结束：先冲掉缓冲里剩余的增量，工具调用帧和
+            # 收尾帧才不会插到未下发的内容前面
+            if delta_parts:
+                yield _content_delta_frame("".join(delta_parts))
+                delta_parts.clear()
+                delta_len = 0
+                last_flush = time.monotonic()
+
+            # 流结束后检查聚合消息中的工具调用
+            tool_calls = getattr(accumulated, 'tool_calls', None) if accumulated is not None else None
+            if tool_calls:
+                logger.info(f"🔧 检测到 {len(tool_calls)} 个工具调用")
+                state["tool_rounds"] += 1
+
+                # 模型重复请求与先前轮次完全相同的 (工具, 参数) 时，
+                # 不再执行工具轮，换成未绑定工具的模型强制直接作答，
+                # 避免浪费一轮搜索往返 + 工具轮 LLM 调用
+                call_keys = {_canonical_tool_key(tc) for tc in tool_calls}
+                if call_keys <= seen_calls:
+                    logger.warning("⚠️ 检测到重复工具调用，跳过执行并直接生成回答")
+                    model = get_chat_model(model_name)
+                    continue
+                seen_calls |= call_keys
+
                 # 发送工具调用通知
                 tool_call_data = {
                     "type": "tool_calls",
@@ -608,22 +1051,30 @@ async def generate_streaming_response_with_tools(
                         {
                             "name": tc.get("name"),
                             "args": tc.get("args")
-                        } for tc in response.tool_calls
+                        } for tc in tool_calls
                     ],
                     "timestamp": datetime.now().isoformat()
                 }
-                yield f"data: {json.dumps(tool_call_data, ensure_ascii=False)}\n\n"
-                
+                yield _sse(tool_call_data)
+
                 # 添加助手消息
-                messages.append(response)
-                
-                # 执行工具调用
-                tool_messages = await execute_tool_calls(response.tool_calls, messages)
-                
-                # 添加工具消息
-                messages.extend(tool_messages)
-                
-                # 发送工具结果
+                messages.append(accumulated)
+
+                # 执行工具调用：每个工具一完成就把部分结果推给前端，
+                # 不必等最慢的那个
+                tool_messages = []
+                async for tm in execute_tool_calls_streaming(tool_calls, messages, tool_result_cache):
+                    messages.append(tm)
+                    tool_messages.append(tm)
+                    partial_data = {
+                        "type": "tool_result_partial",
+                        "tool": tm.name,
+                        "content": tm.content[:200] + "..." if len(tm.content) > 200 else tm.content,
+                        "timestamp": _NOW_ISO
+                    }
+                    yield _sse(partial_data)
+
+                # 发送工具结果（汇总帧，保持旧版字段兼容现有前端）
                 tool_result_data = {
                     "type": "tool_results",
                     "results": [
@@ -634,79 +1085,16 @@ async def generate_streaming_response_with_tools(
                     ],
                     "timestamp": datetime.now().isoformat()
                 }
-                yield f"data: {json.dumps(tool_result_data, ensure_ascii=False)}\n\n"
-                
+                yield _sse(tool_result_data)
+
                 # 继续下一轮
                 continue
-            
-            # 没有工具调用，生成最终流式响应
-            logger.info(f"📝 开始流式输出最终响应")
+
+            # 没有工具调用，最终响应已在上面的循环中流式输出完毕
+            logger.info(f"📝 最终响应流式输出完成")
             break
-        
-        if iteration >= max_iterations:
+        else:
             logger.warning(f"⚠️ 达到最大迭代次数 {max_iterations}")
-        
-        # 流式输出最终响应（重新调用以获取流式输出）
-        full_response = ""
-        is_reasoner_model = model_name == "deepseek-reasoner"
-        thought_process_started = False
-        thought_process_ended = False
-        answer_started = False
-        
-        chunk_count = 0
-        async for chunk in model.astream(messages):
-            chunk_count += 1
-            logger.debug(f"收到第 {chunk_count} 个chunk")
-
-            # 对于reasoner模型，特殊处理思维链
-            if is_reasoner_model and hasattr(chunk, 'additional_kwargs') and chunk.additional_kwargs:
-                reasoning_content = chunk.additional_kwargs.get("reasoning_content")
-                if reasoning_content:
-                    if not thought_process_started:
-                        thought_process_started = True
-                        thought_data = {
-                            "type": "thought_process_start",
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
-                    
-                    thought_data = {
-                        "type": "thought_process_content",
-                        "content": reasoning_content,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
-                    continue
-
-            # 处理普通内容块
-            if hasattr(chunk, 'content') and chunk.content:
-                content = chunk.content
-
-                # 如果是reasoner模型且已经开始思维过程但还没结束，则发送思维过程结束信号
-                if is_reasoner_model and thought_process_started and not thought_process_ended:
-                    thought_process_ended = True
-                    thought_end_data = {
-                        "type": "thought_process_end",
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield f"data: {json.dumps(thought_end_data, ensure_ascii=False)}\n\n"
-
-                # 如果还没开始发送答案，则发送答案开始信号
-                if not answer_started:
-                    answer_started = True
-                    answer_start_data = {
-                        "type": "answer_start",
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield f"data: {json.dumps(answer_start_data, ensure_ascii=False)}\n\n"
-
-                full_response += content
-                data = {
-                    "type": "content_delta",
-                    "content": content,
-                    "timestamp": datetime.now().isoformat()
-                }
-                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
         # 确保在流结束时发送思维过程结束信号
         if is_reasoner_model and thought_process_started and not thought_process_ended:
@@ -715,12 +1103,19 @@ async def generate_streaming_response_with_tools(
                 "type": "thought_process_end",
                 "timestamp": datetime.now().isoformat()
             }
-            yield f"data: {json.dumps(thought_end_data, ensure_ascii=False)}\n\n"
+            yield _sse(thought_end_data)
 
-        # 提取引用信息
-        references = extract_references_from_content(full_response, pdf_chunks) if pdf_chunks else []
+        full_response = "".join(response_parts)
+
+        # 提取引用信息（正则扫描放线程池，长回答+大块集时不卡事件循环）
+        references = (
+            await asyncio.to_thread(extract_references_from_content, full_response, pdf_chunks)
+            if pdf_chunks else []
+        )
         logger.info(f"📚 提取到 {len(references)} 个引用")
-        
+        state["full_response"] = full_response
+        state["references"] = references
+
         # 发送完成信号
         final_data = {
             "type": "message_complete",
@@ -728,164 +1123,86 @@ async def generate_streaming_response_with_tools(
             "timestamp": datetime.now().isoformat(),
             "references": references
         }
-        # 将 assistant 消息保存到会话存储（如果提供了 session_id）
+        # 将 assistant 消息保存到会话存储（如果提供了 session_id），写入走后台线程
         if session_id:
-            try:
-                assistant_msg = {
-                    "role": "assistant",
-                    "content": full_response,
-                    "references": references,
-                    "timestamp": datetime.now().isoformat()
-                }
-                append_message(session_id, assistant_msg)
-            except Exception:
-                logger.warning("会话写入失败: 无法保存 assistant 消息")
-
-        yield f"data: {json.dumps(final_data, ensure_ascii=False)}\n\n"
-        
-    except Exception as e:
-        logger.error(f"❌ 流式响应生成失败: {e}")
-        error_data = {
-            "type": "error",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }
-        yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
-
-async def generate_streaming_response(
-    messages: List[BaseMessage], 
-    model_name: str,
-    pdf_chunks: List[Dict[str, Any]] = None
-) -> AsyncGenerator[str, None]:
-    """生成流式响应（兼容旧版本，不支持工具）"""
-    try:
-        logger.info(f"开始生成流式响应，模型: {model_name}")
-        logger.info(f"消息数量: {len(messages)}")
-        
-        # 如果有PDF内容，将其添加到系统消息中
-        if pdf_chunks and len(pdf_chunks) > 0:
-            logger.info(f"检测到 {len(pdf_chunks)} 个PDF块，添加到上下文中")
-            pdf_content = "\n\n=== 参考文档内容 ===\n"
-            for i, chunk in enumerate(pdf_chunks, 1):
-                content = chunk.get("content", "")[:500]  # 限制长度
-                source_info = chunk.get("metadata", {}).get("source_info", f"文档块 {i}")
-                pdf_content += f"\n[{i}] {content}\n来源: {source_info}\n"
-            
-            # 在第一条消息前添加PDF内容
-            if messages and isinstance(messages[0], SystemMessage):
-                messages[0].content += pdf_content
-                logger.info(f"已将PDF内容添加到系统提示词中")
-        
-        model = get_chat_model(model_name)
-        logger.info(f"模型初始化完成")
-        
-        # 创建流式响应
-        full_response = ""
-        logger.info(f"开始流式生成...")
-        
-        is_reasoner_model = model_name == "deepseek-reasoner"
-        thought_process_started = False
-        thought_process_ended = False
-        answer_started = False
-        
-        chunk_count = 0
-        async for chunk in model.astream(messages):
-            chunk_count += 1
-            logger.debug(f"收到第 {chunk_count} 个chunk: {chunk}")
-
-            # 对于reasoner模型，特殊处理思维链和答案的流式输出
-            if is_reasoner_model and hasattr(chunk, 'additional_kwargs') and chunk.additional_kwargs:
-                reasoning_content = chunk.additional_kwargs.get("reasoning_content")
-                if reasoning_content:
-                    if not thought_process_started:
-                        thought_process_started = True
-                        thought_data = {
-                            "type": "thought_process_start",
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
-                    
-                    thought_data = {
-                        "type": "thought_process_content",
-                        "content": reasoning_content,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield f"data: {json.dumps(thought_data, ensure_ascii=False)}\n\n"
-
-                    # 不再检查chunk.content，直接continue处理下一个chunk
-                    continue
-
-            # 处理普通内容块
-            if hasattr(chunk, 'content') and chunk.content:
-                content = chunk.content
-
-                # 如果是reasoner模型且已经开始思维过程但还没结束，则发送思维过程结束信号
-                if is_reasoner_model and thought_process_started and not thought_process_ended:
-                    thought_process_ended = True
-                    thought_end_data = {
-                        "type": "thought_process_end",
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield f"data: {json.dumps(thought_end_data, ensure_ascii=False)}\n\n"
-
-                # 如果还没开始发送答案，则发送答案开始信号
-                if not answer_started:
-                    answer_started = True
-                    answer_start_data = {
-                        "type": "answer_start",
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield f"data: {json.dumps(answer_start_data, ensure_ascii=False)}\n\n"
-
-                full_response += content
-                data = {
-                    "type": "content_delta",
-                    "content": content,
-                    "timestamp": datetime.now().isoformat()
-                }
-                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-
-        # 确保在流结束时发送思维过程结束信号（如果没有发送过）
-        if is_reasoner_model and thought_process_started and not thought_process_ended:
-            thought_process_ended = True
-            thought_end_data = {
-                "type": "thought_process_end",
+            assistant_msg = {
+                "role": "assistant",
+                "content": full_response,
+                "references": references,
                 "timestamp": datetime.now().isoformat()
             }
-            yield f"data: {json.dumps(thought_end_data, ensure_ascii=False)}\n\n"
+            _persist_message_async(session_id, assistant_msg)
 
+        yield _sse(final_data)
 
-        # 提取引用信息
-        references = extract_references_from_content(full_response, pdf_chunks) if pdf_chunks else []
-        logger.info(f"提取到 {len(references)} 个引用")
-        
-        # 发送完成信号
-        final_data = {
-            "type": "message_complete",
-            "full_content": full_response,
-            "timestamp": datetime.now().isoformat(),
-            "references": references
-        }
-        yield f"data: {json.dumps(final_data, ensure_ascii=False)}\n\n"
-        
     except Exception as e:
-        logger.error(f"流式响应生成失败: {e}")
+        state["error"] = True
+        logger.error(f"❌ 流式响应生成失败: {e}")
         error_data = {
             "type": "error",
             "error": str(e),
             "timestamp": datetime.now().isoformat()
         }
-        yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+        yield _sse(error_data)
+
+def _prebuilt_json(payload: Dict[str, Any]) -> Optional[Response]:
+    """导入时预序列化静态端点的响应体；orjson 缺省时返回 None 走默认路径"""
+    if orjson is None:
+        return None
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+
+# 下面几个端点的载荷完全静态，序列化一次后请求期只是返回同一个对象
+_ROOT_PAYLOAD = {
+    "message": "多模态 RAG 工作台 API",
+    "version": "1.0.0",
+    "status": "running",
+    "langchain_version": "1.0.0"
+}
+_ROOT_RESPONSE = _prebuilt_json(_ROOT_PAYLOAD)
+
+_MODELS_PAYLOAD = {
+    "models": [
+        {
+            "id": "deepseek-chat",
+            "name": "DeepSeek Chat",
+            "description": "DeepSeek通用对话模型"
+        },
+        {
+            "id": "deepseek-reasoner",
+            "name": "DeepSeek Reasoner",
+            "description": "DeepSeek推理模型，支持显示推理过程"
+        },
+        {
+            "id": "qwen3-vl-8b-instruct",
+            "name": "Qwen3 VL 8B Instruct",
+            "description": "通义千问3视觉语言模型，支持图像理解"
+        }
+    ]
+}
+_MODELS_RESPONSE = _prebuilt_json(_MODELS_PAYLOAD)
+
+_KNOWLEDGE_BASES_PAYLOAD = {
+    "knowledge_bases": [
+        {
+            "id": "default",
+            "name": "默认知识库",
+            "description": "通用知识库"
+        },
+        {
+            "id": "technical",
+            "name": "技术文档",
+            "description": "技术相关文档库"
+        }
+    ]
+}
+_KNOWLEDGE_BASES_RESPONSE = _prebuilt_json(_KNOWLEDGE_BASES_PAYLOAD)
+
 
 @app.get("/")
 async def root():
     """健康检查接口"""
-    return {
-        "message": "多模态 RAG 工作台 API",
-        "version": "1.0.0",
-        "status": "running",
-        "langchain_version": "1.0.0"
-    }
+    return _ROOT_RESPONSE if _ROOT_RESPONSE is not None else _ROOT_PAYLOAD
 
 @app.post("/api/chat/stream")
 async def chat_stream(request: MessageRequest):
@@ -917,16 +1234,13 @@ async def chat_stream(request: MessageRequest):
         current_message = create_multimodal_message(request)
         messages.append(current_message)
 
-        try:
-            user_msg = {
-                "role": "user",
-                "content": request.content or "",
-                "content_blocks": [b.dict() for b in request.content_blocks] if request.content_blocks else [],
-                "timestamp": datetime.now().isoformat()
-            }
-            append_message(session_id, user_msg)
-        except Exception:
-            logger.warning("会话写入失败: 无法保存用户消息")
+        user_msg = {
+            "role": "user",
+            "content": request.content or "",
+            "content_blocks": [b.dict() for b in request.content_blocks] if request.content_blocks else [],
+            "timestamp": datetime.now().isoformat()
+        }
+        _persist_message_async(session_id, user_msg)
 
         # 返回流式响应（支持工具调用）
         enable_tools = request.model in ["deepseek-chat", None]
@@ -939,11 +1253,13 @@ async def chat_stream(request: MessageRequest):
                 enable_tools=enable_tools,
                 session_id=session_id
             ),
-            media_type="text/plain",
+            media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
-                "Content-Type": "text/event-stream",
+                # 禁止 nginx 等反向代理缓冲SSE，保证逐token到达客户端
+                "X-Accel-Buffering": "no",
+                "X-Content-Type-Options": "nosniff",
             }
         )
         
@@ -973,40 +1289,37 @@ async def chat_sync(request: MessageRequest):
         # 添加当前用户消息（支持多模态）并持久化
         current_message = create_multimodal_message(request)
         messages.append(current_message)
-        try:
-            user_msg = {
-                "role": "user",
-                "content": request.content or "",
-                "content_blocks": [b.dict() for b in request.content_blocks] if request.content_blocks else [],
-                "timestamp": datetime.now().isoformat()
-            }
-            append_message(session_id, user_msg)
-        except Exception:
-            logger.warning("会话写入失败: 无法保存用户消息")
+        user_msg = {
+            "role": "user",
+            "content": request.content or "",
+            "content_blocks": [b.dict() for b in request.content_blocks] if request.content_blocks else [],
+            "timestamp": datetime.now().isoformat()
+        }
 
         # 获取模型响应
         model = get_chat_model(request.model)
         response = await model.ainvoke(messages)
 
-        # 持久化 assistant 消息
-        try:
-            assistant_msg = {
-                "role": "assistant",
-                "content": response.content,
-                "references": [],
-                "timestamp": datetime.now().isoformat()
-            }
-            append_message(session_id, assistant_msg)
-        except Exception:
-            logger.warning("会话写入失败: 无法保存 assistant 消息")
-
-        return MessageResponse(
-            content=response.content,
-            role="assistant",
-            timestamp=datetime.now().isoformat(),
-            references=[],
-            session_id=session_id
-        )
+        # 一问一答合并成一次批量持久化（后台线程写入，存储只走一轮）
+        assistant_msg = {
+            "role": "assistant",
+            "content": response.content,
+            "references": [],
+            "timestamp": datetime.now().isoformat()
+        }
+        _persist_messages_async(session_id, [user_msg, assistant_msg])
+
+        # 直接回 ORJSONResponse 跳过响应侧的 pydantic 校验与 jsonable_encoder
+        payload = {
+            "content": response.content,
+            "role": "assistant",
+            "timestamp": datetime.now().isoformat(),
+            "references": [],
+            "session_id": session_id
+        }
+        if orjson is not None:
+            return ORJSONResponse(payload)
+        return MessageResponse(**payload)
         
     except Exception as e:
         logger.error(f"同步聊天请求处理失败: {e}")
@@ -1014,50 +1327,32 @@ async def chat_sync(request: MessageRequest):
 
 @app.get("/api/models")
 async def get_models():
-    """获取可用模型列表"""
-    return {
-        "models": [
-            {
-                "id": "deepseek-chat",
-                "name": "DeepSeek Chat",
-                "description": "DeepSeek通用对话模型"
-            },
-            {
-                "id": "deepseek-reasoner",
-                "name": "DeepSeek Reasoner",
-                "description": "DeepSeek推理模型，支持显示推理过程"
-            },
-            {
-                "id": "qwen3-vl-8b-instruct",
-                "name": "Qwen3 VL 8B Instruct",
-                "description": "通义千问3视觉语言模型，支持图像理解"
-            }
-        ]
-    }
+    """获取可用模型列表（静态载荷，返回预序列化响应）"""
+    return _MODELS_RESPONSE if _MODELS_RESPONSE is not None else _MODELS_PAYLOAD
+
+@app.post("/api/admin/reset-model-cache")
+async def api_reset_model_cache():
+    """清空模型实例缓存（修改 .env / 配置后调用以重建模型客户端）"""
+    reset_model_cache()
+    return {"success": True}
 
 @app.get("/api/knowledge-bases")
 async def get_knowledge_bases():
-    """获取知识库列表"""
-    return {
-        "knowledge_bases": [
-            {
-                "id": "default",
-                "name": "默认知识库",
-                "description": "通用知识库"
-            },
-            {
-                "id": "technical",
-                "name": "技术文档",
-                "description": "技术相关文档库"
-            }
-        ]
-    }
+    """获取知识库列表（静态载荷，返回预序列化响应）"""
+    return _KNOWLEDGE_BASES_RESPONSE if _KNOWLEDGE_BASES_RESPONSE is not None else _KNOWLEDGE_BASES_PAYLOAD
 
 
 @app.get("/api/conversations")
 async def api_list_conversations():
-    """列出所有会话（元数据）"""
-    return list_conversations()
+    """列出所有会话（元数据）。
+
+    直接返回 Response 跳过 FastAPI 的 jsonable_encoder 全量遍历，
+    会话多时该遍历开销可观。
+    """
+    convs = list_conversations()
+    if orjson is not None:
+        return Response(content=orjson.dumps(convs), media_type="application/json")
+    return convs
 
 
 @app.post("/api/conversations")
@@ -1085,47 +1380,40 @@ async def api_delete_conversation(session_id: str):
     return {"success": True}
 
 @app.post("/api/pdf/process")
-async def process_pdf_stream(file_data: Dict[str, Any]):
+async def process_pdf_stream(file: UploadFile = File(...)):
     """
-    流式处理PDF文档
+    流式处理PDF文档（multipart 直传，与 /api/audio/process 一致）
+
+    相比旧的 base64-in-JSON 方式，省去约33%的传输体积、
+    多兆字符串的 JSON 解析和整段 base64 解码。
     """
     try:
-        # 提取请求数据
-        content = file_data.get("content", "")  # base64编码的PDF内容
-        filename = file_data.get("filename", "document.pdf")
-        
-        if not content:
+        filename = file.filename or "document.pdf"
+        pdf_bytes = await file.read()
+
+        if not pdf_bytes:
             raise HTTPException(status_code=400, detail="缺少PDF内容")
         
-        # 解码base64数据
-        import base64
-        try:
-            pdf_bytes = base64.b64decode(content.split(',')[-1])  # 去除data:application/pdf;base64,前缀
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"PDF数据解码失败: {str(e)}")
-        
         logger.info(f"开始处理PDF: {filename}, 大小: {len(pdf_bytes)} bytes")
         
         # 定义流式响应生成器
         async def generate_pdf_stream():
             try:
                 async for chunk in pdf_processor.process_pdf_stream(pdf_bytes, filename):
-                    chunk_data = json.dumps(chunk, ensure_ascii=False)
-                    yield f"data: {chunk_data}\n\n"
-                    
+                    yield _sse(chunk)
+
                     # 如果是错误，立即结束
                     if chunk.get("type") == "error":
                         break
-                        
+
             except Exception as e:
                 logger.error(f"PDF流式处理失败: {str(e)}")
-                error_chunk = json.dumps({
+                yield _sse({
                     "type": "error",
                     "error": f"处理过程中出错: {str(e)}"
-                }, ensure_ascii=False)
-                yield f"data: {error_chunk}\n\n"
-            
-            yield "data: [DONE]\n\n"
+                })
+
+            yield b"data: [DONE]\n\n"
         
         return StreamingResponse(
             generate_pdf_stream(),
@@ -1134,6 +1422,8 @@ async def process_pdf_stream(file_data: Dict[str, Any]):
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "Access-Control-Allow-Origin": "*",
+                "X-Accel-Buffering": "no",
+                "X-Content-Type-Options": "nosniff",
             }
         )
         
@@ -1158,7 +1448,10 @@ async def extract_pdf_pages(file_data: Dict[str, Any]):
         # 解码PDF数据
         import base64
         try:
-            pdf_bytes = base64.b64decode(content.split(',')[-1])
+            # 同 /api/pdf/process：去前缀不整串复制，解码放线程池
+            i = content.find(',')
+            payload = content[i + 1:] if i >= 0 else content
+            pdf_bytes = await asyncio.to_thread(base64.b64decode, payload)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"PDF数据解码失败: {str(e)}")
         
@@ -1167,11 +1460,15 @@ async def extract_pdf_pages(file_data: Dict[str, Any]):
         # 提取页面图像
         page_images = await pdf_processor.extract_pdf_pages_as_images(pdf_bytes, max_pages)
         
-        return {
+        # 载荷含多张base64大图，绕过 jsonable_encoder 的全量遍历
+        result = {
             "success": True,
             "total_pages": len(page_images),
             "images": page_images
         }
+        if orjson is not None:
+            return ORJSONResponse(result)
+        return result
         
     except Exception as e:
         logger.error(f"PDF页面提取失败: {str(e)}")
@@ -1208,16 +1505,19 @@ async def process_audio(file: UploadFile = File(...)):
         
         try:
             # 处理音频
-            result = audio_processor.process_audio_file(temp_file_path, file.filename)
+            result = await audio_processor.process_audio_file(temp_file_path, file.filename)
             
             logger.info(f"音频处理成功: {file.filename}")
-            return {
+            payload = {
                 "success": True,
                 "filename": result["filename"],
                 "transcription": result["transcription"],
                 "duration": result["duration"],
                 "format": result["format"]
             }
+            if orjson is not None:
+                return ORJSONResponse(payload)
+            return payload
         
         finally:
             # 清理临时文件
@@ -1,7 +1,6 @@
+import asyncio
 import base64
-import io
 import fitz  # PyMuPDF
-from PIL import Image
 from typing import List, Dict, Any, AsyncGenerator, Tuple
 from langchain_unstructured import UnstructuredLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -34,10 +33,13 @@ class PDFProcessor:
                 "progress": 10
             }
             
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(file_content)
-                tmp_file_path = tmp_file.name
+            # 创建临时文件：mkstemp 直接拿裸 fd，一次 os.write 落盘，
+            # 跳过 NamedTemporaryFile 的缓冲IO包装层
+            fd, tmp_file_path = tempfile.mkstemp(suffix='.pdf')
+            try:
+                os.write(fd, file_content)
+            finally:
+                os.close(fd)
             
             try:
                 # Step 2: 加载PDF文档
@@ -74,12 +76,8 @@ class PDFProcessor:
                     "progress": 60
                 }
                 
-                # 合并所有文档内容并调试输出
-                full_text = "\n\n".join([doc.page_content for doc in documents])
-                logger.info(f"合并后文本长度: {len(full_text)} 字符")
-                
                 # 调试：输出前200个字符看看提取到了什么
-                preview = full_text[:200] if full_text else "空内容"
+                preview = documents[0].page_content[:200] if documents and documents[0].page_content else "空内容"
                 logger.info(f"文本预览: {repr(preview)}")
                 
                 # 检查文档元数据
@@ -88,63 +86,66 @@ class PDFProcessor:
                     if doc.page_content:
                         logger.info(f"文档{i}预览: {repr(doc.page_content[:100])}")
                 
-                # 使用RecursiveCharacterTextSplitter进行智能分块
-                text_chunks = self.text_splitter.split_text(full_text)
-                logger.info(f"文本分块完成，共 {len(text_chunks)} 个块")
+                # 直接对 Document 列表做智能分块：每个切块继承来源块的
+                # 元数据（含页码），不再合并全文副本，也免去事后反查页码
+                chunk_docs = self.text_splitter.split_documents(documents)
+                logger.info(f"文本分块完成，共 {len(chunk_docs)} 个块")
                 
                 # Step 4: 构建文档块
                 yield {
                     "type": "progress",
                     "step": "building_chunks",
-                    "message": f"正在构建 {len(text_chunks)} 个文档块...",
+                    "message": f"正在构建 {len(chunk_docs)} 个文档块...",
                     "progress": 80
                 }
                 
-                # 构建带元数据的文档块（包含页码信息）
-                document_chunks = []
-                for i, chunk in enumerate(text_chunks):
-                    if chunk.strip():  # 过滤空块
-                        # 尝试从原始文档块中获取页码信息
-                        page_number = 1  # 默认页码
-                        if documents:
-                            # 寻找包含此chunk内容的原始文档块
-                            for doc in documents:
-                                if hasattr(doc, 'metadata') and 'page_number' in doc.metadata:
-                                    if chunk.strip()[:50] in doc.page_content:
-                                        page_number = doc.metadata.get('page_number', 1)
-                                        break
-                        
+                # 构建带元数据的文档块（包含页码信息），边构建边下发：
+                # 不在内存里攒完整个 chunks 列表再一次性发送，
+                # 大PDF时首个块在切分后毫秒级就能到达前端，峰值内存 O(1)
+                emitted_chunks = 0
+                total_characters = 0
+                total = len(chunk_docs)
+                for i, chunk_doc in enumerate(chunk_docs):
+                    content = chunk_doc.page_content.strip()
+                    if content:  # 过滤空块
+                        page_number = chunk_doc.metadata.get("page_number", 1)
                         doc_chunk = {
                             "id": f"{filename}_{i}",
-                            "content": chunk.strip(),
+                            "content": content,
                             "metadata": {
                                 "source": filename,
                                 "chunk_id": i,
-                                "chunk_size": len(chunk),
-                                "total_chunks": len(text_chunks),
+                                "chunk_size": len(chunk_doc.page_content),
+                                "total_chunks": total,
                                 "page_number": page_number,
                                 "reference_id": f"[{i+1}]",
                                 "source_info": f"{filename} - 第{page_number}页"
                             }
                         }
-                        document_chunks.append(doc_chunk)
+                        emitted_chunks += 1
+                        total_characters += len(content)
+                        yield {
+                            "type": "chunk",
+                            "chunk": doc_chunk,
+                            "index": i,
+                            "total": total
+                        }
                 
                 # Step 5: 完成处理
                 yield {
                     "type": "progress",
                     "step": "completed",
-                    "message": f"处理完成！共生成 {len(document_chunks)} 个文档块",
+                    "message": f"处理完成！共生成 {emitted_chunks} 个文档块",
                     "progress": 100
                 }
                 
-                # 返回处理结果
+                # 返回处理摘要（块本身已逐条下发）
                 yield {
-                    "type": "result",
-                    "chunks": document_chunks,
+                    "type": "result_summary",
                     "summary": {
                         "filename": filename,
-                        "total_chunks": len(document_chunks),
-                        "total_characters": sum(len(chunk["content"]) for chunk in document_chunks),
+                        "total_chunks": emitted_chunks,
+                        "total_characters": total_characters,
                         "processing_strategy": "hi_res"
                     }
                 }
@@ -161,49 +162,75 @@ class PDFProcessor:
                 "error": f"PDF处理失败: {str(e)}"
             }
     
-    def pdf_page_to_base64(self, pdf_content: bytes, page_number: int) -> str:
+    @staticmethod
+    async def open_pdf(file_content: bytes) -> "fitz.Document":
+        """在线程池中解析PDF并返回打开的文档。
+
+        解析交叉引用表对大文件是 O(文件大小) 的工作，放线程池避免
+        阻塞事件循环；需要同时取文本和页面图像的调用方打开一次后
+        传给各个方法复用，省掉重复解析。
+        """
+        return await asyncio.to_thread(fitz.open, stream=file_content, filetype="pdf")
+
+    def pdf_page_to_base64(self, pdf_content: bytes, page_number: int,
+                           document: "fitz.Document" = None) -> str:
         """
         将PDF页面转换为base64编码的图像
         用于多模态模型处理
+
+        传入已打开的 document 时直接复用，不再重新解析PDF
         """
         try:
-            # 从内存中打开PDF
-            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
+            pdf_document = document if document is not None else fitz.open(
+                stream=pdf_content, filetype="pdf")
             page = pdf_document.load_page(page_number - 1)  # 0-based indexing
             pix = page.get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            pdf_document.close()
+            # tobytes 在C层直接产出压缩PNG，省掉 PIL 的像素拷贝和纯Python编码
+            png_bytes = pix.tobytes("png")
+            if document is None:
+                pdf_document.close()
             
-            return base64.b64encode(buffer.getvalue()).decode("utf-8")
+            return base64.b64encode(png_bytes).decode("utf-8")
             
         except Exception as e:
             logger.error(f"PDF页面转图像失败: {str(e)}")
             raise
     
-    async def extract_pdf_pages_as_images(self, file_content: bytes, max_pages: int = 5) -> List[str]:
+    @staticmethod
+    def _encode_page_png(pix: "fitz.Pixmap") -> str:
+        """把一页的像素图编码为base64 PNG（CPU密集，放线程池执行）。
+
+        tobytes 走 libpng 的C实现，免去 PIL 的 Image.frombytes 像素拷贝。
+        """
+        return base64.b64encode(pix.tobytes("png")).decode("utf-8")
+
+    async def extract_pdf_pages_as_images(self, file_content: bytes, max_pages: int = 5,
+                                          document: "fitz.Document" = None) -> List[str]:
         """
         提取PDF的前几页作为图像，用于多模态处理
+        （可传入已打开的 document 复用同一次解析）
+
+        栅格化仍按页顺序执行（MuPDF 同一文档不允许跨线程并发渲染），
+        但占大头的 PNG 编码 + base64 在取完像素后并行丢进线程池，
+        多页提取的墙钟时间随核数下降，且不再阻塞事件循环。
         """
         try:
-            pdf_document = fitz.open(stream=file_content, filetype="pdf")
+            pdf_document = document if document is not None else await self.open_pdf(file_content)
             total_pages = len(pdf_document)
             pages_to_extract = min(max_pages, total_pages)
-            
-            images = []
+
+            pixmaps = []
             for page_num in range(pages_to_extract):
                 page = pdf_document.load_page(page_num)
-                pix = page.get_pixmap()
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                buffer = io.BytesIO()
-                img.save(buffer, format="PNG")
-                base64_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
-                images.append(base64_image)
-            
-            pdf_document.close()
+                pixmaps.append(page.get_pixmap())
+
+            # Pixmap 独立于文档，各线程编码各自的页互不冲突
+            images = list(await asyncio.gather(*[
+                asyncio.to_thread(self._encode_page_png, pix)
+                for pix in pixmaps
+            ]))
+            if document is None:
+                pdf_document.close()
             logger.info(f"提取了 {len(images)} 页PDF图像")
             return images
             
@@ -11,6 +11,10 @@ from pathlib import Path
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
+# 先于任何配置构造载入 .env
+from dotenv import load_dotenv
+load_dotenv(current_dir / ".env")
+
 # 设置环境变量
 from env_config import setup_environment
 setup_environment()
@@ -79,15 +83,23 @@ def main():
     try:
         # 使用 uvicorn 命令行方式启动，避免导入问题
         import subprocess
-        
+        from config import settings
+
         cmd = [
-            sys.executable, 
-            "-m", "uvicorn", 
+            sys.executable,
+            "-m", "uvicorn",
             "main:app",
-            "--host", "localhost",
-            "--port", "8000"
+            "--host", settings.host,
+            "--port", str(settings.port),
         ]
-        
+        # 热重载仅在显式配置 RELOAD=true 时启用；多 worker 与 reload 互斥
+        # （事件循环/HTTP协议栈保持 uvicorn 的 auto：装了 uvloop/httptools
+        # 时自动选用C实现）
+        if settings.reload:
+            cmd.append("--reload")
+        elif settings.workers > 1:
+            cmd += ["--workers", str(settings.workers)]
+
         print(f"🚀 执行命令: {' '.join(cmd)}")
         subprocess.run(cmd, check=True)
         
@@ -0,0 +1,40 @@
+"""
+回归测试：同步聊天端点的批量会话持久化链路
+
+_persist_messages_async 依赖 main 命名空间里的 append_messages，
+漏掉 import 会让 /api/chat 在模型调用成功后照样 500（NameError）。
+"""
+import asyncio
+
+import pytest
+
+import conversation_store
+import main
+
+
+def test_append_messages_imported():
+    """main 必须直接引用 conversation_store.append_messages（防再次漏 import）"""
+    assert main.append_messages is conversation_store.append_messages
+
+
+@pytest.mark.asyncio
+async def test_persist_messages_async_batches(monkeypatch):
+    """一问一答应合并成一次 append_messages 调用，且在后台任务里完成"""
+    calls = []
+
+    def fake_append(session_id, batch):
+        calls.append((session_id, list(batch)))
+        return True
+
+    monkeypatch.setattr(main, "append_messages", fake_append)
+    batch = [
+        {"role": "user", "content": "你好"},
+        {"role": "assistant", "content": "你好！"},
+    ]
+    main._persist_messages_async("sess-1", batch)
+    # 写入被调度为线程池里的后台任务，轮询等待其落地
+    for _ in range(100):
+        if calls:
+            break
+        await asyncio.sleep(0.01)
+    assert calls == [("sess-1", batch)]
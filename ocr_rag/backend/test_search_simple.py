@@ -2,19 +2,33 @@
 简单测试网络搜索工具
 """
 import asyncio
-from web_search_tool import web_search
+
+import pytest
+
+from tools.web_search_tool import web_search
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_web_search_simple():
+    """发一次真实搜索，校验返回的是非空格式化文本"""
+    result = await web_search.ainvoke({"query": "Python", "max_results": 2})
+    assert isinstance(result, str)
+    assert result.strip(), "搜索返回了空文本"
+    # 工具内部捕获异常并返回 "搜索失败: ..."，这里显式判掉
+    assert not result.startswith("搜索失败"), result
 
 
 async def main():
     print("测试网络搜索工具...")
-    
+
     try:
         result = await web_search.ainvoke({"query": "Python", "max_results": 2})
         print("\n搜索成功!")
         print("结果预览:")
         print(result[:300])
         print("\n✅ 测试通过!")
-        
+
     except Exception as e:
         print(f"\n❌ 测试失败: {e}")
         import traceback
@@ -22,4 +36,10 @@ async def main():
 
 
 if __name__ == "__main__":
+    # 与 main.py 相同：有 uvloop 就用更快的事件循环，缺省时静默回退
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -9,20 +9,56 @@
 
 此工具以 `@tool` 导出，供模型在工具链中调用。
 """
+import asyncio
+import hashlib
+import heapq
 import re
 import json
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Dict, Any
 from loguru import logger
 from langchain_core.tools import tool
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 模块级预编译正则：审查按批调用，每次调用重新 compile 同样的模式纯属浪费
+_TOKEN_RE = re.compile(r"[\w\u4e00-\u9fff]+")
+
+# 每条记录以 "[i] title" 开头，接着有一行以 "📝" 开头的 snippet，
+# 可能有 "🔗 url"，最后有 "📍 来源: source"
+_ENTRY_RE = re.compile(
+    r"\[(?P<index>\d+)\]\s*(?P<title>.*?)\n📝\s*(?P<snippet>.*?)(?:\n🔗\s*(?P<url>.*?))?\n📍 来源:\s*(?P<source>.*?)\n\n",
+    re.S
+)
+
+def _dumps(obj: Dict[str, Any]) -> str:
+    """序列化审查输出；orjson 原生UTF-8且为C实现，缺省时退回 stdlib json"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+# 降级解析时识别三类标记行的交替式：一趟 finditer 替代逐行多次 startswith
+_FALLBACK_LINE_RE = re.compile(
+    r"^(?:📝\s*(?P<snip>.*)|🔗\s*(?P<url>.*)|.*?来源:?\s*(?P<src>.*))$",
+    re.M
+)
+
+_YEAR_RE = re.compile(r"(\d{4})年")
+
+# 时效信号合并成一个交替模式：一趟 finditer 同时捕获提示词与年份，
+# 替代对同一段文本的多趟 search/findall
+_RECENCY_SCAN_RE = re.compile(r"(?P<kw>最近|日前|小时|今天|昨日|昨天|本周|本月|刚刚)|(?P<year>\d{4})年")
+
 
 def _tokenize(text: str) -> List[str]:
-    text = text or ""
-    # 简单拆分并去掉常见标点
-    tokens = re.findall(r"[\w\u4e00-\u9fff]+", text.lower())
-    # 去掉非常短的词
-    return [t for t in tokens if len(t) > 1]
+    # 只对匹配出的短 token 做 lower，不给整段文本拷贝一个小写副本
+    # （CJK 的 lower 是空操作，ASCII token 远短于原文）；同时去掉非常短的词
+    return [t.lower() for t in _TOKEN_RE.findall(text or "") if len(t) > 1]
 
 
 def _parse_formatted_results(formatted: str) -> List[Dict[str, Any]]:
@@ -34,13 +70,7 @@ def _parse_formatted_results(formatted: str) -> List[Dict[str, Any]]:
         return []
 
     entries = []
-    # 每条记录以 "[i] title" 开头，接着有一行以 "📝" 开头的 snippet，可能有 "🔗 url"，最后有 "📍 来源: source"
-    pattern = re.compile(
-        r"\[(?P<index>\d+)\]\s*(?P<title>.*?)\n📝\s*(?P<snippet>.*?)(?:\n🔗\s*(?P<url>.*?))?\n📍 来源:\s*(?P<source>.*?)\n\n",
-        re.S
-    )
-
-    for m in pattern.finditer(formatted):
+    for m in _ENTRY_RE.finditer(formatted):
         entries.append({
             "index": int(m.group("index")),
             "title": (m.group("title") or "").strip(),
@@ -53,18 +83,18 @@ def _parse_formatted_results(formatted: str) -> List[Dict[str, Any]]:
     if not entries:
         blocks = [b.strip() for b in formatted.split('\n\n') if b.strip()]
         for i, b in enumerate(blocks, 1):
-            lines = b.split('\n')
-            title = lines[0] if lines else f"结果 {i}"
+            head, _, body = b.partition('\n')
+            title = head or f"结果 {i}"
             snippet = ''
             url = ''
             source = ''
-            for ln in lines[1:]:
-                if ln.startswith('📝'):
-                    snippet = ln.replace('📝', '').strip()
-                elif ln.startswith('🔗'):
-                    url = ln.replace('🔗', '').strip()
-                elif '来源' in ln or '来源:' in ln:
-                    source = ln.split(':')[-1].strip()
+            for m in _FALLBACK_LINE_RE.finditer(body):
+                if m.group('snip') is not None:
+                    snippet = m.group('snip').strip()
+                elif m.group('url') is not None:
+                    url = m.group('url').strip()
+                elif m.group('src') is not None:
+                    source = m.group('src').strip()
 
             entries.append({
                 'index': i,
@@ -77,30 +107,30 @@ def _parse_formatted_results(formatted: str) -> List[Dict[str, Any]]:
     return entries
 
 
-def _date_mentioned(text: str) -> List[str]:
-    """在文本中查找可能的日期字符串，返回发现的日期片段"""
-    if not text:
-        return []
-    patterns = [
-        r"\d{4}年\d{1,2}月\d{1,2}日",
-        r"\d{4}-\d{1,2}-\d{1,2}",
-        r"\d{1,2}月\d{1,2}日",
-    ]
-    found = []
-    for p in patterns:
-        found += re.findall(p, text)
-    return found
-
-
-def _compute_relevance_score(question: str, title: str, snippet: str) -> float:
-    """基于关键词重合计算简单相关性得分（0-1）"""
-    q_tokens = set(_tokenize(question))
-    doc_tokens = set(_tokenize(title + ' ' + snippet))
-    if not q_tokens or not doc_tokens:
+def _compute_relevance_score(q_tokens: frozenset, title: str, snippet: str) -> float:
+    """基于关键词重合计算简单相关性得分（0-1，Jaccard）。
+
+    问题侧的分词在一次审查内对所有条目都相同，由调用方算好传入，
+    这里只对文档侧做一次分词。
+    """
+    if not q_tokens:
+        return 0.0
+    # 文档侧边去重边数交集，单趟完成：不再先建一个 token 集合
+    # 再做 & / | 的两趟集合运算
+    inter = 0
+    seen = set()
+    seen_add = seen.add
+    for t in _TOKEN_RE.findall(title + ' ' + snippet):
+        if len(t) > 1:
+            t = t.lower()
+            if t not in seen:
+                seen_add(t)
+                if t in q_tokens:
+                    inter += 1
+    if not seen:
         return 0.0
-    inter = q_tokens & doc_tokens
-    union = q_tokens | doc_tokens
-    return len(inter) / len(union)
+    # |并集| = |a| + |b| - |交集|
+    return inter / (len(q_tokens) + len(seen) - inter)
 
 
 def _compute_recency_score(current_date: str, title: str, snippet: str) -> float:
@@ -116,7 +146,7 @@ def _compute_recency_score(current_date: str, title: str, snippet: str) -> float
         if current_date:
             # 支持 'YYYY-MM-DD' 或 'YYYY年MM月DD日' 的解析
             if '年' in current_date:
-                now_year = int(re.search(r"(\d{4})年", current_date).group(1))
+                now_year = int(_YEAR_RE.search(current_date).group(1))
             else:
                 now_year = int(current_date.split('-')[0])
     except Exception:
@@ -127,54 +157,62 @@ def _compute_recency_score(current_date: str, title: str, snippet: str) -> float
     if current_date and (current_date in text or current_date.replace('-', '年') in text):
         return 1.0
 
-    # 含有“最近/日前/小时/今天/昨日/昨天/本周/本月”等词
-    if re.search(r"最近|日前|小时|今天|昨日|昨天|本周|本月|刚刚", text):
-        return 0.8
+    # 一趟扫描同时找时效提示词与年份：提示词是更强的信号，命中即短路；
+    # 年份只记第一个，扫完再判
+    first_year = None
+    for m in _RECENCY_SCAN_RE.finditer(text):
+        if m.group('kw'):
+            return 0.8
+        if first_year is None:
+            first_year = m.group('year')
 
-    # 查找年份
-    years = re.findall(r"(\d{4})年", text)
-    if years:
+    if first_year is not None:
         try:
-            if now_year and int(years[0]) == now_year:
+            if now_year and int(first_year) == now_year:
                 return 0.6
-            else:
-                return 0.2
+            return 0.2
         except Exception:
             return 0.2
 
     return 0.3
 
 
-@tool
-async def review_search_results(formatted_results: str, user_question: str, current_date: str = '') -> str:
-    """
-    审查搜索结果：判断哪些结果与用户问题相关并给出理由。
+# 审查结果缓存：模型重试/多轮对话里常用完全相同的参数重复调用审查，
+# 纯函数输出可直接复用。键为三个入参拼接后的 blake2b-128 摘要（定长、
+# 不持有原文），LRU 淘汰最久未用项
+_REVIEW_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_REVIEW_CACHE_MAX = 256
 
-    Args:
-        formatted_results: 来自 `web_search` 的格式化文本（或其他类似文本）
-        user_question: 用户原始问题/上下文
-        current_date: 可选，传入当前日期字符串（例如 '2025-11-22' 或 '2025年11月22日'），用于时间一致性判断
 
-    Returns:
-        JSON 字符串，结构如下：
-        {
-          "summary": "简短审查结论",
-          "recommendations": [1,3],
-          "entries": [ {index, title, snippet, url, source, relevance_score, recency_score, final_score, reasons: []}, ... ]
-        }
-    """
+def _review_cache_key(formatted_results: str, user_question: str, current_date: str) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(formatted_results.encode('utf-8'))
+    h.update(b'\x00')
+    h.update(user_question.encode('utf-8'))
+    h.update(b'\x00')
+    h.update(current_date.encode('utf-8'))
+    return h.digest()
+
+
+def _review_impl(formatted_results: str, user_question: str, current_date: str = '') -> str:
+    """审查的同步实现：纯正则 + 字典的CPU工作，由异步壳丢进线程池执行"""
     try:
         entries = _parse_formatted_results(formatted_results)
 
-        results = []
-        rec_list = []
+        # 问题只分词一次，所有条目共享同一个 frozenset
+        q_token_list = _tokenize(user_question)
+        q_tokens = frozenset(q_token_list)
+
+        # 条目数已知：预分配后按下标写入，省掉 append 的渐进扩容
+        n = len(entries)
+        results = [None] * n
 
-        for e in entries:
+        for i, e in enumerate(entries):
             title = e.get('title', '')
             snippet = e.get('snippet', '')
             idx = e.get('index')
 
-            rel = _compute_relevance_score(user_question, title, snippet)
+            rel = _compute_relevance_score(q_tokens, title, snippet)
             rec = _compute_recency_score(current_date or '', title, snippet)
 
             # 最终分数：关键词相关性占比 0.7，时间一致性 0.3
@@ -193,7 +231,7 @@ async def review_search_results(formatted_results: str, user_question: str, curr
             else:
                 reasons.append("时间不明确或较旧")
 
-            results.append({
+            results[i] = {
                 'index': idx,
                 'title': title,
                 'snippet': snippet,
@@ -203,16 +241,16 @@ async def review_search_results(formatted_results: str, user_question: str, curr
                 'recency_score': round(rec, 3),
                 'final_score': round(final, 3),
                 'reasons': reasons,
-            })
+            }
 
         # 推荐：选取 final_score >= threshold 或 top-N
         threshold = 0.4
         recommended = [r['index'] for r in results if r['final_score'] >= threshold]
 
-        # 如果没有任何达到阈值，则取 top2
+        # 如果没有任何达到阈值，则取 top2（nlargest 不用整表排序）
         if not recommended and results:
-            sorted_by_score = sorted(results, key=lambda x: x['final_score'], reverse=True)
-            recommended = [sorted_by_score[i]['index'] for i in range(min(2, len(sorted_by_score)))]
+            recommended = [r['index'] for r in
+                           heapq.nlargest(2, results, key=lambda x: x['final_score'])]
 
         summary = f"共解析到 {len(results)} 条结果，推荐使用 {len(recommended)} 条。"
 
@@ -222,16 +260,50 @@ async def review_search_results(formatted_results: str, user_question: str, curr
             'entries': results,
             'metadata': {
                 'checked_at': datetime.now().isoformat(),
-                'question_tokens': len(_tokenize(user_question))
+                'question_tokens': len(q_token_list)
             }
         }
 
         logger.info(f"🔎 审查完成：{summary}")
-        return json.dumps(output, ensure_ascii=False)
+        return _dumps(output)
 
     except Exception as e:
         logger.error(f"审查工具执行失败: {e}")
-        return json.dumps({'error': str(e)}, ensure_ascii=False)
+        return _dumps({'error': str(e)})
+
+
+@tool
+async def review_search_results(formatted_results: str, user_question: str, current_date: str = '') -> str:
+    """
+    审查搜索结果：判断哪些结果与用户问题相关并给出理由。
+
+    Args:
+        formatted_results: 来自 `web_search` 的格式化文本（或其他类似文本）
+        user_question: 用户原始问题/上下文
+        current_date: 可选，传入当前日期字符串（例如 '2025-11-22' 或 '2025年11月22日'），用于时间一致性判断
+
+    Returns:
+        JSON 字符串，结构如下：
+        {
+          "summary": "简短审查结论",
+          "recommendations": [1,3],
+          "entries": [ {index, title, snippet, url, source, relevance_score, recency_score, final_score, reasons: []}, ... ]
+        }
+    """
+    key = _review_cache_key(formatted_results, user_question, current_date or '')
+    cached = _REVIEW_CACHE.get(key)
+    if cached is not None:
+        _REVIEW_CACHE.move_to_end(key)
+        logger.info("🔎 审查命中缓存，直接返回")
+        return cached
+
+    # 函数体没有任何 await，全是正则/集合运算——直接跑会把事件循环
+    # 卡住整个审查时长，并发聊天的 SSE 全部冻结；放线程池执行
+    result = await asyncio.to_thread(_review_impl, formatted_results, user_question, current_date)
+    _REVIEW_CACHE[key] = result
+    if len(_REVIEW_CACHE) > _REVIEW_CACHE_MAX:
+        _REVIEW_CACHE.popitem(last=False)
+    return result
 
 
 # 导出工具列表以便被 main.py 导入绑定
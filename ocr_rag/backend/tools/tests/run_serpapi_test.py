@@ -1,6 +1,7 @@
 from pathlib import Path
 import sys
 import asyncio
+import pytest
 from dotenv import load_dotenv
 
 # 确保 backend 目录在 sys.path
@@ -14,6 +15,9 @@ load_dotenv(dotenv_path=backend_dir / '.env')
 
 from tools.web_search_tool import get_search_tool
 
+# 整个模块都打真实的 SerpAPI
+pytestmark = pytest.mark.integration
+
 
 async def run_search():
     tool = get_search_tool(search_engine='serpapi', max_results=3)
@@ -29,4 +33,10 @@ async def run_search():
 
 
 if __name__ == '__main__':
+    # 与 main.py 相同：有 uvloop 就用更快的事件循环，缺省时静默回退
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(run_search())
@@ -1,6 +1,14 @@
 import asyncio
+import heapq
 import json
 import sys
+
+import pytest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -14,6 +22,12 @@ load_dotenv(backend_dir / '.env')
 from tools.web_search_tool import web_search
 from tools.search_review_tool import review_search_results
 
+# 限制并发搜索数：流程测试被并发/重复运行时，有界信号量避免对搜索
+# 后端的连接抖动，尾延迟更可预测
+_SEARCH_SEM = asyncio.Semaphore(8)
+
+@pytest.mark.integration
+@pytest.mark.asyncio
 async def test_flow():
     query = "2025年11月22日 Gemini 3.0 发布 最近30天 新闻"
     print(f"1. Executing search for: {query} (max_results=20)")
@@ -21,7 +35,8 @@ async def test_flow():
     try:
         # Invoke web_search tool
         # Note: The tool expects 'query' and 'max_results'
-        search_result_text = await web_search.ainvoke({"query": query, "max_results": 20})
+        async with _SEARCH_SEM:
+            search_result_text = await web_search.ainvoke({"query": query, "max_results": 20})
     except Exception as e:
         print(f"Search failed: {e}")
         return
@@ -51,7 +66,8 @@ async def test_flow():
     # 3. Filter (Logic from main.py)
     print("\n3. Applying filtering logic...")
     try:
-        review_json = json.loads(review_json_str)
+        # 审查输出可能很大（20条含中文的条目），优先走orjson解析
+        review_json = orjson.loads(review_json_str) if orjson is not None else json.loads(review_json_str)
         recommendations = review_json.get('recommendations', [])
         entries = review_json.get('entries', [])
         
@@ -60,22 +76,29 @@ async def test_flow():
         
         # Logic from main.py
         if recommendations and entries:
-            entry_map = {e['index']: e for e in entries}
-            final_entries = []
+            # index 是解析器产出的 1..N 小整数：位置数组直接下标寻址，
+            # 免去 dict 的逐次哈希
+            max_idx = max((e['index'] for e in entries), default=0)
+            entry_arr = [None] * (max_idx + 1)
+            for e in entries:
+                entry_arr[e['index']] = e
+            # 最多取10条：定长预分配 + 下标写入，最后裁到实际条数
+            final_entries = [None] * 10
+            k = 0
             for idx in recommendations[:10]:
-                if idx in entry_map:
-                    final_entries.append(entry_map[idx])
+                if 0 <= idx <= max_idx and entry_arr[idx] is not None:
+                    final_entries[k] = entry_arr[idx]
+                    k += 1
+            final_entries = final_entries[:k]
             
-            # Fill up to 10 if needed
+            # Fill up to 10 if needed (nlargest is O(N log k) vs sorting everything)
             if len(final_entries) < 10:
                 existing_indices = set(e['index'] for e in final_entries)
-                sorted_entries = sorted(entries, key=lambda x: x.get('final_score', 0), reverse=True)
-                for e in sorted_entries:
-                    if len(final_entries) >= 10:
-                        break
-                    if e['index'] not in existing_indices:
-                        final_entries.append(e)
-                        existing_indices.add(e['index'])
+                final_entries.extend(heapq.nlargest(
+                    10 - len(final_entries),
+                    [e for e in entries if e['index'] not in existing_indices],
+                    key=lambda x: x.get('final_score', 0)
+                ))
             
             print(f"\nFinal filtered count: {len(final_entries)}")
             print("-" * 50)
@@ -91,4 +114,10 @@ async def test_flow():
         print(f"Filtering failed: {e}")
 
 if __name__ == "__main__":
+    # 与 main.py 相同：有 uvloop 就用更快的事件循环，缺省时静默回退
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(test_flow())
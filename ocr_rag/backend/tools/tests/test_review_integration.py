@@ -1,4 +1,4 @@
-import asyncio
+import pytest
 
 from main import execute_tool_calls
 from langchain_core.messages import HumanMessage
@@ -16,16 +16,17 @@ class FakeSearchTool:
         )
 
 
-def test_review_merging_behavior():
+@pytest.mark.asyncio
+async def test_review_merging_behavior(monkeypatch):
     tool_call = {'name': 'web_search', 'args': {'query': '人工智能 最新 新闻', 'max_results': 3}, 'id': 'test-1'}
     messages = [HumanMessage(content='请告诉我最近的人工智能新闻')]
     import main
-    orig_web_tools = list(getattr(main, 'WEB_SEARCH_TOOLS', []))
-    try:
-        main.WEB_SEARCH_TOOLS = [FakeSearchTool()]
-        tool_messages = asyncio.get_event_loop().run_until_complete(execute_tool_calls([tool_call], messages))
-        assert len(tool_messages) >= 1
-        combined = '\n'.join([tm.content for tm in tool_messages])
-        assert '[REVIEW_RESULTS]' in combined
-    finally:
-        main.WEB_SEARCH_TOOLS = orig_web_tools
+    # execute_tool_calls 通过导入期快照 _TOOLS_BY_NAME 解析工具，
+    # 替换映射里的条目（monkeypatch 自动还原）才能拦住真实网络搜索
+    monkeypatch.setitem(main._TOOLS_BY_NAME, 'web_search', FakeSearchTool())
+    tool_messages = await execute_tool_calls([tool_call], messages)
+    assert len(tool_messages) >= 1
+    combined = '\n'.join(tm.content for tm in tool_messages)
+    # 审查管线会把搜索结果重写为筛选后的文本并保留推荐条目
+    assert '经审查筛选后的搜索结果' in combined
+    assert '测试标题' in combined
@@ -2,10 +2,15 @@
 测试：tools 下的网络搜索工具
 """
 import asyncio
+
+import pytest
 from loguru import logger
 
 from tools.web_search_tool import web_search, search_recent_news, get_search_tool
 
+# 三个测试都发真实搜索请求：统一标成 integration，快速跑时整模块排除
+pytestmark = [pytest.mark.integration, pytest.mark.asyncio]
+
 
 async def test_web_search():
     logger.info("测试 tools.web_search_tool:web_search")
@@ -37,4 +42,10 @@ async def main():
 
 
 if __name__ == '__main__':
+    # 与 main.py 相同：有 uvloop 就用更快的事件循环，缺省时静默回退
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
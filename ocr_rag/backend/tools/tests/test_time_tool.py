@@ -14,4 +14,10 @@ async def main():
 
 
 if __name__ == '__main__':
+    # 与 main.py 相同：有 uvloop 就用更快的事件循环，缺省时静默回退
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -3,13 +3,60 @@
 用于访问特定URL并提取网页内容
 """
 import asyncio
-import requests
-from bs4 import BeautifulSoup
-from typing import Optional, Dict, Any
+import ipaddress
+import re
+import socket
+import time
+import httpx
+from lxml import etree
+from lxml import html as lxml_html
+from typing import Optional, Dict, Any, List
 from urllib.parse import urlparse, urljoin
+from urllib import robotparser
 from loguru import logger
 from langchain_core.tools import tool
 
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+try:
+    from tenacity import (
+        AsyncRetrying,
+        retry_if_exception_type,
+        stop_after_attempt,
+        wait_exponential_jitter,
+    )
+except ImportError:
+    AsyncRetrying = None
+
+# 值得重试的瞬时状态码；4xx确定性失败（404/403等）不浪费重试预算
+_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class _TransientHTTPStatus(Exception):
+    """瞬时HTTP状态（429/5xx），标记给退避重试逻辑识别"""
+
+
+_BROWSER_UA = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+               ' (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+# 主内容候选区域合并为一个编译好的XPath：一趟求值替代逐个CSS选择器
+# 查询（contains(@class,'content') 同时覆盖 main-content/article-content/
+# post-content/entry-content 等变体），都不中时落到 body
+_MAIN_CONTENT_XPATH = etree.XPath(
+    "(//main | //*[@role='main'] | //*[@id='main'] | //*[@id='content']"
+    " | //*[contains(@class,'content')] | //body)[1]"
+)
+_META_DESC_XPATH = etree.XPath("string(//meta[@name='description']/@content)")
+_META_OG_DESC_XPATH = etree.XPath("string(//meta[@property='og:description']/@content)")
+
+# 文本清理：先修掉每个换行两侧的行内空白，再把3个以上连续换行压成
+# 空行——两趟C层 sub 替代按行 split/strip/join 的Python级列表构建
+_WS_RE = re.compile(r'[ \t\r\f\v]*\n[ \t\r\f\v]*')
+_MULTI_NL_RE = re.compile(r'\n{3,}')
+
 
 class WebScraper:
     """网页抓取工具类"""
@@ -24,83 +71,160 @@ class WebScraper:
         """
         self.timeout = timeout
         self.max_content_length = max_content_length
-        self.session = requests.Session()
-
-        # 设置请求头，模拟浏览器
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+        # 抓取是纯I/O负载：异步客户端让大量URL同时在飞、连接池复用，
+        # 不再把同步 requests 压进线程池（并发被线程数卡死，每线程还占栈内存）
+        self.session = httpx.AsyncClient(
+            # HTTP/2：同一host的多URL抓取在一条TCP连接上多路复用，
+            # 省掉逐连接握手（依赖 httpx[http2] 的 h2）
+            http2=True,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=75.0,
+            ),
+            follow_redirects=True,
+            # 设置请求头，模拟浏览器
+            headers={
+                'User-Agent': _BROWSER_UA,
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Accept-Language': 'zh-CN,zh;q=0.8,en-US;q=0.5,en;q=0.3',
+                # br 约比 gzip 再小20%；装了 brotli 包 httpx 自动解压
+                'Accept-Encoding': 'gzip, deflate, br',
+                'Upgrade-Insecure-Requests': '1',
+            },
+        )
+
+        # 响应缓存：URL → (etag, last_modified, 新鲜截止时间, 已解析结果)。
+        # 新鲜期内直接命中（省网络RTT+HTML解析）；过期后带验证头回源，
+        # 304 时复用解析结果只花一个header往返。死链（404/410）同样记
+        # 1小时，避免迭代式检索反复撞。cachetools 缺省时整个缓存禁用
+        self._cache = TTLCache(maxsize=1024, ttl=3600) if TTLCache is not None else None
+        self._fresh_ttl = 300.0
+        # 按host缓存的URL门禁结果（robots.txt 解析器 / 是否私网地址），
+        # 24小时过期；cachetools 缺省时退化为不过期的普通字典
+        self._robots_cache = TTLCache(maxsize=256, ttl=86400) if TTLCache is not None else {}
+        self._private_host_cache = TTLCache(maxsize=256, ttl=86400) if TTLCache is not None else {}
+
+    async def _fetch_with_retry(self, url: str,
+                                headers: Optional[Dict[str, str]] = None) -> "tuple[httpx.Response, bytes]":
+        """流式GET并在socket层截断正文，返回 (响应, 原始字节)。
+
+        正文按64KB块边收边计数，超过 max_content_length 的约4倍
+        （HTML到正文的经验压缩比）就停止下载——超大/恶意页面只花
+        上限内的带宽和解析CPU，截断的HTML前缀照常可解析。
+        重试策略同前：瞬时故障（连接错误/超时/429/5xx）退避重试3次。
+        """
+        max_bytes = self.max_content_length * 4
+
+        async def _once() -> "tuple[httpx.Response, bytes]":
+            async with self.session.stream("GET", url, headers=headers) as response:
+                if response.status_code in _RETRY_STATUS:
+                    raise _TransientHTTPStatus(f"HTTP {response.status_code}: {url}")
+                chunks = []
+                total = 0
+                async for c in response.aiter_bytes(65536):
+                    chunks.append(c)
+                    total += len(c)
+                    if total >= max_bytes:
+                        logger.warning(f"⚠️ 正文超过 {max_bytes} 字节，已在传输层截断: {url}")
+                        break
+                return response, b''.join(chunks)
+
+        if AsyncRetrying is None:
+            return await _once()
+
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential_jitter(initial=1, max=30),
+            retry=retry_if_exception_type((httpx.TransportError, _TransientHTTPStatus)),
+            reraise=True,
+        ):
+            with attempt:
+                return await _once()
+
+    async def aclose(self) -> None:
+        """关闭底层HTTP客户端（应用退出时调用，归还连接池）"""
+        await self.session.aclose()
 
     def _is_valid_url(self, url: str) -> bool:
-        """验证URL是否有效"""
+        """验证URL是否有效（只放行 http/https，挡掉 mailto:/javascript: 等）"""
         try:
             parsed = urlparse(url)
-            return bool(parsed.scheme and parsed.netloc)
+            return parsed.scheme in ('http', 'https') and bool(parsed.netloc)
         except Exception:
             return False
 
-    def _extract_main_content(self, soup: BeautifulSoup, url: str) -> str:
+    async def _host_is_private(self, host: str) -> bool:
+        """判断host是否解析到私网/回环地址（结果按host缓存24小时）。
+
+        挡掉指向内网的抓取请求，也省去后面整条请求+解析流水线。
+        DNS解析是阻塞调用，丢线程池执行。
+        """
+        cached = self._private_host_cache.get(host)
+        if cached is not None:
+            return cached
+        try:
+            addr = await asyncio.to_thread(socket.gethostbyname, host)
+            private = ipaddress.ip_address(addr).is_private
+        except (socket.gaierror, ValueError, OSError):
+            # 解析失败不在这里拦：让正式请求去报具体的网络错误
+            private = False
+        self._private_host_cache[host] = private
+        return private
+
+    async def _robots_allows(self, parsed, url: str) -> bool:
+        """按 robots.txt 判断URL是否允许抓取（解析器按host缓存24小时）。
+
+        每个host只取一次 robots.txt；取不到时按惯例放行。
+        """
+        host = parsed.netloc
+        rp = self._robots_cache.get(host)
+        if rp is None:
+            rp = robotparser.RobotFileParser()
+            rp.allow_all = True
+            try:
+                resp = await self.session.get(f"{parsed.scheme}://{host}/robots.txt")
+                if resp.status_code == 200:
+                    rp.allow_all = False
+                    rp.parse(resp.text.splitlines())
+            except httpx.HTTPError:
+                pass
+            self._robots_cache[host] = rp
+        return rp.can_fetch(_BROWSER_UA, url)
+
+    def _extract_main_content(self, tree: "lxml_html.HtmlElement", url: str) -> str:
         """
         从HTML中提取主要内容
 
         Args:
-            soup: BeautifulSoup对象
+            tree: lxml HTML 树
             url: 原始URL
 
         Returns:
             提取的文本内容
         """
-        # 移除不需要的元素
-        for element in soup.find_all(['script', 'style', 'nav', 'header', 'footer', 'aside', 'advertisement']):
-            element.decompose()
-
-        # 尝试多种策略提取主要内容
-        content_selectors = [
-            'main',
-            '[role="main"]',
-            '.main-content',
-            '.content',
-            '.article-content',
-            '.post-content',
-            '#main',
-            '#content',
-            '.entry-content'
-        ]
-
-        main_content = None
-        for selector in content_selectors:
-            main_content = soup.select_one(selector)
-            if main_content:
-                break
-
-        # 如果没找到特定内容区域，使用body
-        if not main_content:
-            main_content = soup.find('body') or soup
-
-        # 提取文本
-        text = main_content.get_text(separator='\n', strip=True)
-
-        # 清理文本
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        cleaned_text = '\n\n'.join(lines)
-
-        return cleaned_text
-
-    def _get_page_info(self, soup: BeautifulSoup, url: str) -> Dict[str, str]:
+        # 一次C层遍历剥除噪声元素，替代逐个 find_all + decompose
+        etree.strip_elements(
+            tree,
+            'script', 'style', 'nav', 'header', 'footer', 'aside', 'advertisement',
+            with_tail=False
+        )
+
+        # 预编译XPath一趟找主内容区域；没有候选时用整棵树
+        nodes = _MAIN_CONTENT_XPATH(tree)
+        main_content = nodes[0] if nodes else tree
+
+        # text_content 在C层拼接全部文本，再做两趟正则清理
+        text = main_content.text_content()
+        return _MULTI_NL_RE.sub('\n\n', _WS_RE.sub('\n', text)).strip()
+
+    def _get_page_info(self, tree: "lxml_html.HtmlElement", url: str) -> Dict[str, str]:
         """获取页面基本信息"""
-        title = soup.find('title')
-        title_text = title.get_text().strip() if title else "无标题"
+        title_text = (tree.findtext('.//title') or '').strip() or "无标题"
 
-        # 尝试获取描述
-        description = ""
-        meta_desc = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', attrs={'property': 'og:description'})
-        if meta_desc:
-            description = meta_desc.get('content', '').strip()
+        # 尝试获取描述（优先 name=description，再退到 og:description）
+        description = _META_DESC_XPATH(tree).strip() or _META_OG_DESC_XPATH(tree).strip()
 
         return {
             'title': title_text,
@@ -127,15 +251,64 @@ class WebScraper:
                 'url': url
             }
 
+        # URL门禁：私网/回环目标与 robots.txt 禁止的路径直接拒绝，
+        # 不进入请求+解析流水线（两类判定都按host缓存）
+        parsed = urlparse(url)
+        if await self._host_is_private(parsed.hostname or ''):
+            return {
+                'error': f'目标主机解析到私网/回环地址，已拒绝抓取: {url}',
+                'content': '',
+                'title': '',
+                'description': '',
+                'url': url
+            }
+        if not await self._robots_allows(parsed, url):
+            return {
+                'error': f'robots.txt 不允许抓取该路径: {url}',
+                'content': '',
+                'title': '',
+                'description': '',
+                'url': url
+            }
+
+        now = time.monotonic()
+        cached = self._cache.get(url) if self._cache is not None else None
+        if cached is not None and now < cached[2]:
+            logger.info(f"⚡ 缓存命中（新鲜期内）: {url}")
+            return cached[3]
+
         try:
             logger.info(f"🌐 开始抓取网页: {url}")
 
-            # 在线程池中执行同步请求
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.session.get(url, timeout=self.timeout, allow_redirects=True)
-            )
+            # 过期但有验证器的条目走条件请求：源站未变时只传回 304 头
+            cond_headers = {}
+            if cached is not None:
+                if cached[0]:
+                    cond_headers['If-None-Match'] = cached[0]
+                if cached[1]:
+                    cond_headers['If-Modified-Since'] = cached[1]
+
+            # 异步请求：等待期间事件循环可继续处理其他抓取/聊天流
+            response, raw = await self._fetch_with_retry(url, headers=cond_headers or None)
+
+            if response.status_code == 304 and cached is not None:
+                # 源站未变：续期并复用已解析结果，跳过正文传输和HTML解析
+                logger.info(f"⚡ 304 未修改，复用缓存: {url}")
+                self._cache[url] = (cached[0], cached[1], now + self._fresh_ttl, cached[3])
+                return cached[3]
+
+            if response.status_code in (404, 410):
+                result = {
+                    'error': f'页面不存在 (HTTP {response.status_code})',
+                    'content': '',
+                    'title': '',
+                    'description': '',
+                    'url': url
+                }
+                # 死链负缓存：1小时内不再回源
+                if self._cache is not None:
+                    self._cache[url] = (None, None, now + 3600.0, result)
+                return result
 
             response.raise_for_status()
 
@@ -150,14 +323,17 @@ class WebScraper:
                     'url': url
                 }
 
-            # 解析HTML
-            soup = BeautifulSoup(response.content, 'lxml')
+            # 解析HTML：直接用 lxml 建树（C层构建与遍历，免去 BS4 的
+            # Python包装层）；响应头声明charset时显式指定，跳过编码探测
+            charset = response.charset_encoding
+            parser = lxml_html.HTMLParser(encoding=charset) if charset else None
+            tree = lxml_html.fromstring(raw, parser=parser)
 
             # 获取页面信息
-            page_info = self._get_page_info(soup, url)
+            page_info = self._get_page_info(tree, url)
 
             # 提取主要内容
-            content = self._extract_main_content(soup, url)
+            content = self._extract_main_content(tree, url)
 
             # 限制内容长度
             if len(content) > self.max_content_length:
@@ -172,10 +348,18 @@ class WebScraper:
                 'content_length': len(content)
             }
 
+            if self._cache is not None:
+                self._cache[url] = (
+                    response.headers.get('etag'),
+                    response.headers.get('last-modified'),
+                    now + self._fresh_ttl,
+                    result,
+                )
+
             logger.info(f"✅ 网页抓取成功: {page_info['title']} ({len(content)} 字符)")
             return result
 
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, _TransientHTTPStatus) as e:
             error_msg = f"网络请求错误: {str(e)}"
             logger.error(f"❌ {error_msg}")
             return {
@@ -209,6 +393,28 @@ def get_web_scraper() -> WebScraper:
     return _scraper_instance
 
 
+async def close_web_scraper() -> None:
+    """若抓取客户端已创建则将其关闭（FastAPI shutdown 钩子调用）"""
+    global _scraper_instance
+    if _scraper_instance is not None:
+        await _scraper_instance.aclose()
+        _scraper_instance = None
+
+
+def _format_scrape_result(result: Dict[str, Any]) -> str:
+    """把 scrape_url 的结构化结果格式化成给模型看的文本"""
+    if 'error' in result:
+        return f"❌ 访问失败: {result['error']}"
+
+    formatted = f"📄 网页标题: {result['title']}\n"
+    if result['description']:
+        formatted += f"📝 页面描述: {result['description']}\n"
+    formatted += f"🔗 URL: {result['url']}\n"
+    formatted += f"📊 内容长度: {result['content_length']} 字符\n\n"
+    formatted += f"📖 页面内容:\n{'-'*50}\n{result['content']}"
+    return formatted
+
+
 @tool
 async def fetch_webpage(url: str) -> str:
     """
@@ -229,19 +435,7 @@ async def fetch_webpage(url: str) -> str:
     try:
         scraper = get_web_scraper()
         result = await scraper.scrape_url(url)
-
-        if 'error' in result:
-            return f"❌ 访问失败: {result['error']}"
-
-        # 格式化输出
-        formatted = f"📄 网页标题: {result['title']}\n"
-        if result['description']:
-            formatted += f"📝 页面描述: {result['description']}\n"
-        formatted += f"🔗 URL: {result['url']}\n"
-        formatted += f"📊 内容长度: {result['content_length']} 字符\n\n"
-        formatted += f"📖 页面内容:\n{'-'*50}\n{result['content']}"
-
-        return formatted
+        return _format_scrape_result(result)
 
     except Exception as e:
         error_msg = f"网页抓取工具执行失败: {str(e)}"
@@ -249,7 +443,46 @@ async def fetch_webpage(url: str) -> str:
         return error_msg
 
 
+@tool
+async def fetch_webpages(urls: List[str]) -> str:
+    """
+    并发访问多个网页URL并提取各自内容
+
+    Args:
+        urls: 要访问的完整URL列表，每个都必须包含http://或https://
+
+    Returns:
+        按输入顺序拼接的各网页格式化内容，页与页之间用分隔线隔开
+
+    Examples:
+        - ["https://www.example.com/a", "https://www.example.com/b"]
+    """
+    logger.info(f"🔗 并发访问 {len(urls)} 个网页")
+
+    scraper = get_web_scraper()
+    # 有界并发：最多10个URL同时在飞，单事件循环上扇出，
+    # 不再一个个串行等待
+    sem = asyncio.Semaphore(10)
+
+    async def _one(u: str) -> str:
+        async with sem:
+            result = await scraper.scrape_url(u)
+        return _format_scrape_result(result)
+
+    outputs = await asyncio.gather(*(_one(u) for u in urls), return_exceptions=True)
+
+    sections = []
+    for u, out in zip(urls, outputs):
+        if isinstance(out, BaseException):
+            logger.error(f"❌ 抓取 {u} 失败: {out}")
+            sections.append(f"❌ 访问失败: {u} ({out})")
+        else:
+            sections.append(out)
+    return f"\n\n{'='*50}\n\n".join(sections)
+
+
 # 导出工具列表
 WEB_SCRAPING_TOOLS = [
-    fetch_webpage
+    fetch_webpage,
+    fetch_webpages
 ]
\ No newline at end of file
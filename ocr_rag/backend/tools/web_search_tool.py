@@ -9,6 +9,13 @@ from datetime import datetime
 from loguru import logger
 from langchain_core.tools import tool
 
+from executor import SHARED_EXECUTOR
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 
 class WebSearchTool:
     """网络搜索工具类"""
@@ -17,8 +24,28 @@ class WebSearchTool:
         self.search_engine = search_engine
         self.max_results = max_results
         self.searcher = None
+        # 共享 aiohttp 会话（SerpAPI 异步路径用）：连接/TLS/DNS缓存全程
+        # 复用，不再每次搜索从零握手。必须在事件循环里惰性创建
+        self._aio_session = None
         self._initialize_searcher()
 
+    def _get_aio_session(self):
+        """惰性创建进程共享的 aiohttp 会话；aiohttp 缺省时返回 None"""
+        if aiohttp is None:
+            return None
+        if self._aio_session is None or self._aio_session.closed:
+            self._aio_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100, limit_per_host=10, ttl_dns_cache=300
+                )
+            )
+        return self._aio_session
+
+    async def aclose(self):
+        """关闭共享会话（应用退出时调用）"""
+        if self._aio_session is not None and not self._aio_session.closed:
+            await self._aio_session.close()
+
     def _initialize_searcher(self):
         try:
             if self.search_engine == "duckduckgo":
@@ -86,7 +113,7 @@ class WebSearchTool:
     async def _search_duckduckgo(self, query: str) -> List[Dict[str, Any]]:
         try:
             loop = asyncio.get_event_loop()
-            result_text = await loop.run_in_executor(None, self.searcher.run, query)
+            result_text = await loop.run_in_executor(SHARED_EXECUTOR, self.searcher.run, query)
             results = []
             snippets = result_text.split('\n\n')
             for i, snippet in enumerate(snippets[:self.max_results], 1):
@@ -104,9 +131,15 @@ class WebSearchTool:
 
     async def _search_serpapi(self, query: str, language: str) -> List[Dict[str, Any]]:
         try:
-            loop = asyncio.get_event_loop()
-            # 使用 results 方法获取结构化数据，而不是 run 方法（返回字符串）
-            raw_results = await loop.run_in_executor(None, self.searcher.results, query)
+            # 使用 results/aresults 获取结构化数据，而不是 run 方法（返回字符串）
+            session = self._get_aio_session()
+            if session is not None:
+                # 异步路径：注入共享会话，TCP+TLS 连接跨搜索复用
+                self.searcher.aiosession = session
+                raw_results = await self.searcher.aresults(query)
+            else:
+                loop = asyncio.get_event_loop()
+                raw_results = await loop.run_in_executor(SHARED_EXECUTOR, self.searcher.results, query)
             results = []
             if isinstance(raw_results, dict):
                 organic_results = raw_results.get("organic_results", [])[:self.max_results]
@@ -125,7 +158,7 @@ class WebSearchTool:
     async def _search_tavily(self, query: str) -> List[Dict[str, Any]]:
         try:
             loop = asyncio.get_event_loop()
-            raw_results = await loop.run_in_executor(None, self.searcher.run, query)
+            raw_results = await loop.run_in_executor(SHARED_EXECUTOR, self.searcher.run, query)
             results = []
             if isinstance(raw_results, list):
                 for item in raw_results[:self.max_results]:
@@ -13,6 +13,10 @@ class Settings(BaseSettings):
     host: str = "localhost"
     port: int = 8000
     debug: bool = True
+    # debug 与热重载解耦：reload 只给本地开发显式打开，生产默认关闭
+    # （文件监视会多fork一个进程并禁用部分 asyncio 优化）
+    reload: bool = False
+    workers: int = 1
     
     # CORS 配置
     allowed_origins: List[str] = ["http://localhost:5173", "http://localhost:3000"]
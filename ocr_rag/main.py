@@ -1,4 +1,5 @@
 import os
+import re
 import json
 import asyncio
 from typing import List, Dict, Any, AsyncGenerator
@@ -40,6 +41,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 句末/换行分隔符，预编译成字符类：流式分块时只扫新到的增量，
+# 不再对整个缓冲区做逐分隔符的 in 扫描（那是 O(缓冲区长度×分隔符数)）
+_DELIM_RE = re.compile(r'[.。!！?？\n]')
+
 # 请求模型
 class MessageRequest(BaseModel):
     content: str = Field(..., description="用户消息内容")
@@ -127,8 +132,9 @@ async def generate_streaming_response(
                 full_response += content
                 chunk_buffer += content
                 
-                # 按句子或短语分块发送
-                if any(delimiter in chunk_buffer for delimiter in ['.', '。', '!', '！', '?', '？', '\n']):
+                # 按句子或短语分块发送（缓冲区里只会积累不含分隔符的内容，
+                # 所以只需在新增量里找分隔符）
+                if _DELIM_RE.search(content):
                     # 构造 SSE 格式的数据
                     data = {
                         "type": "content_delta",
@@ -825,26 +825,16 @@ export default function App() {
     });
 
     try {
-      // 将PDF转换为base64
-      const reader = new FileReader();
-      const fileData = await new Promise<string>((resolve, reject) => {
-        reader.onload = (e) => resolve(e.target?.result as string);
-        reader.onerror = reject;
-        reader.readAsDataURL(pdfFile.file);
-      });
+      // multipart 直传PDF文件，省去 base64 编码（+33%体积）与 JSON 封装
+      const formData = new FormData();
+      formData.append('file', pdfFile.file, pdfFile.file.name);
 
       console.log('📤 开始调用PDF处理API');
 
       // 调用PDF处理API
       const response = await fetch('http://localhost:8000/api/pdf/process', {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          content: fileData,
-          filename: pdfFile.file.name
-        })
+        body: formData
       });
 
       if (!response.body) {
@@ -854,6 +844,7 @@ export default function App() {
       const reader2 = response.body.getReader();
       const decoder = new TextDecoder();
       let buffer = '';  // 用于存储不完整的数据
+      const collectedChunks: any[] = [];  // 后端逐块下发，前端边收边攒
 
       while (true) {
         const { done, value } = await reader2.read();
@@ -884,6 +875,18 @@ export default function App() {
                   step: parsed.step || '',
                   message: parsed.message || ''
                 });
+              } else if (parsed.type === 'chunk') {
+                // 增量接收文档块
+                collectedChunks.push(parsed.chunk);
+              } else if (parsed.type === 'result_summary') {
+                // 处理完成，保存累积的文档块
+                setPendingPDFs(prev => prev.map(pdf =>
+                  pdf.id === pdfFile.id
+                    ? { ...pdf, processed: true, chunks: collectedChunks }
+                    : pdf
+                ));
+                console.log('✅ PDF处理完成，文档块数量:', collectedChunks.length);
+                return collectedChunks;
               } else if (parsed.type === 'result') {
                 // 处理完成，保存结果到state（用于UI显示）
                 setPendingPDFs(prev => prev.map(pdf =>
@@ -909,6 +912,15 @@ export default function App() {
         if (data !== '[DONE]' && data) {
           try {
             const parsed = JSON.parse(data);
+            if (parsed.type === 'result_summary') {
+              setPendingPDFs(prev => prev.map(pdf =>
+                pdf.id === pdfFile.id
+                  ? { ...pdf, processed: true, chunks: collectedChunks }
+                  : pdf
+              ));
+              console.log('✅ PDF处理完成（缓冲区），文档块数量:', collectedChunks.length);
+              return collectedChunks;
+            }
             if (parsed.type === 'result') {
               setPendingPDFs(prev => prev.map(pdf =>
                 pdf.id === pdfFile.id
@@ -73,16 +73,18 @@ def main():
     print("-" * 50)
     
     try:
-        from main import app
         import uvicorn
         from config import settings
-        
+
+        # reload/workers 需要以导入字符串方式指定应用；
+        # 热重载仅在显式配置 RELOAD=true 时启用，与多 worker 互斥
         uvicorn.run(
-            app,
+            "main:app",
             host=settings.host,
             port=settings.port,
             log_level=settings.log_level.lower(),
-            reload=settings.debug
+            reload=settings.reload,
+            workers=settings.workers if not settings.reload else None
         )
     except KeyboardInterrupt:
         print("\n👋 服务已停止")
@@ -1,26 +1,21 @@
 import re
 
+# 预编译的引用标记正则：[1]、[2] 等。括号内的 \d+ 本身已无歧义
+# （"2023年"/"100元" 没有方括号不会命中），原先两侧堆的可选标点
+# 字符类不增加约束，反而在长文本上逼正则引擎大量回溯
+_REF_RE = re.compile(r'\[(\d+)\]')
+
 def extract_references_from_content(content: str, pdf_chunks: list = None) -> list:
     """
     从AI回答内容中提取引用信息
     """
     references = []
-    
-    # 查找所有的引用标记 [1], [2], etc.
-    # 使用更简单的正则表达式，避免匹配到普通文本中的数字
-    # 只匹配被空白字符或标点符号包围的引用标记
-    reference_pattern = r'[\s\[\](){}.,;:!?<>""''`~#$%^&*+=|\\/-]*\[(\d+)\][\s\[\](){}.,;:!?<>""''`~#$%^&*+=|\\/-]*'
-    matches = re.findall(reference_pattern, content)
-    
-    # 去重并保持顺序
-    unique_matches = []
-    for match in matches:
-        if match not in unique_matches:
-            unique_matches.append(match)
-    
+
+    # dict.fromkeys 保序去重：O(n)，替代列表 in 查重的 O(n²)
+    unique_matches = dict.fromkeys(int(m) for m in _REF_RE.findall(content))
+
     if unique_matches and pdf_chunks:
-        for match in unique_matches:
-            ref_num = int(match)
+        for ref_num in unique_matches:
             if 1 <= ref_num <= len(pdf_chunks):
                 chunk = pdf_chunks[ref_num - 1]  # 索引从0开始
                 # 增加引用文本的长度到300字符，提供更完整的信息